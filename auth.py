@@ -1,31 +1,45 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
-import psycopg2
+import asyncpg
 import datetime
-import requests
+from ipaddress import ip_address, ip_network
 from urllib.parse import urlencode
-import os
-import configparser
+
+import db
+import http_client
+from settings import config
 
 router = APIRouter()
 
 # === КОНФИГ ===
-config = configparser.ConfigParser()
-config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
-
-DB_HOST = config['database']['host']
-DB_USER = config['database']['user']
-DB_PASSWORD = config['database']['password']
-DB_NAME = config['database']['dbname']
 STEAM_API_KEY = config['steam']['steam_api_key']
 
-def get_db():
-    return psycopg2.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        dbname=DB_NAME
-    )
+# служебные эндпоинты (/dbstats, /metrics, /sync): steamid из [admin] steamids
+# в сессии или адрес клиента из [admin] allow_ips (скрейпер Prometheus);
+# по умолчанию оба списка пусты — эндпоинты закрыты
+ADMIN_STEAMIDS = {
+    s.strip() for s in config.get("admin", "steamids", fallback="").split(",") if s.strip()
+}
+ADMIN_NETWORKS = [
+    ip_network(n.strip()) for n in config.get("admin", "allow_ips", fallback="").split(",") if n.strip()
+]
+
+
+def require_admin(request: Request) -> None:
+    """Зависимость FastAPI: пропускает только админов и доверенные адреса."""
+    if request.client is not None and ADMIN_NETWORKS:
+        try:
+            addr = ip_address(request.client.host)
+        except ValueError:
+            addr = None
+        if addr is not None and any(addr in net for net in ADMIN_NETWORKS):
+            return
+
+    steamid = request.session.get("steamid")
+    if steamid is None:
+        raise HTTPException(401, "Unauthorized")
+    if steamid not in ADMIN_STEAMIDS:
+        raise HTTPException(403, "Forbidden")
 
 
 def is_safe_url(url: str) -> bool:
@@ -48,7 +62,7 @@ async def login(request: Request, next: str = "/"):
     return RedirectResponse(steam_url)
 
 @router.get("/auth")
-async def auth(request: Request, next: str = "/"):
+async def auth(request: Request, next: str = "/", pool: asyncpg.Pool = Depends(db.get_pool)):
     params = dict(request.query_params)
     steam_url = params.get("openid.claimed_id", "")
     if not steam_url:
@@ -58,10 +72,11 @@ async def auth(request: Request, next: str = "/"):
     request.session["steamid"] = steamid
 
     try:
-        user_data = requests.get(
+        resp = await http_client.get(
             f"https://api.steampowered.com/ISteamUser/GetPlayerSummaries/v2/"
             f"?key={STEAM_API_KEY}&steamids={steamid}"
-        ).json()["response"]["players"][0]
+        )
+        user_data = resp.json()["response"]["players"][0]
     except Exception:
         return JSONResponse({"error": "Failed to fetch Steam profile"}, status_code=500)
 
@@ -69,9 +84,8 @@ async def auth(request: Request, next: str = "/"):
     request.session["avatar"] = user_data.get("avatarfull", "")
 
     try:
-        conn = get_db()
-        with conn.cursor() as cursor:
-            cursor.execute("""
+        async with db.acquire(pool) as conn:
+            await conn.execute("""
                 CREATE TABLE IF NOT EXISTS steam_auth (
                     steam_id TEXT PRIMARY KEY,
                     personaname TEXT,
@@ -79,20 +93,18 @@ async def auth(request: Request, next: str = "/"):
                     registered_at TIMESTAMP
                 )
             """)
-            cursor.execute("""
+            await conn.execute("""
                 INSERT INTO steam_auth (steam_id, personaname, avatar, registered_at)
-                VALUES (%s, %s, %s, %s)
+                VALUES ($1, $2, $3, $4)
                 ON CONFLICT (steam_id) DO UPDATE
                 SET personaname = EXCLUDED.personaname,
                     avatar = EXCLUDED.avatar
-            """, (
+            """,
                 steamid,
                 user_data.get("personaname", "Unknown"),
                 user_data.get("avatarfull", ""),
                 datetime.datetime.utcnow()
-            ))
-        conn.commit()
-        conn.close()
+            )
     except Exception as e:
         print(f"DB error: {e}")
 
@@ -0,0 +1,405 @@
+# benchmarks/bench_inventory.py
+"""
+Бенчмарк загрузки и отдачи инвентаря на снимках inventoryJson/<steamid>.json.
+
+Снимки (готовые ответы /getjsoninv) разворачиваются обратно в страницы
+steamapis по 2 000 ассетов: count ассетов на позицию, синтетические
+теги. Страницы отдаёт локальный HTTP-заглушка-сервер, приложение
+(main.app) гоняется в процессе через httpx.ASGITransport с настоящим
+lifespan и локальным Postgres из config.ini (или --dsn).
+
+Сценарии: /inventory/{steamid}/{appid} (каждый запрос — полная загрузка,
+FRESH_SECONDS=0), /getjsoninv холодный (кэш steamid вычищается перед
+запросом), из файлового кэша, 304 по ETag и страницы по 100 позиций
+(sort=total, с курсором до конца инвентаря); плюс микропути parse_tags,
+_compose_item_json и normalize_item. Результат — JSON в stdout или --out.
+
+    python benchmarks/bench_inventory.py [--requests 50] [--concurrency 8]
+    python benchmarks/bench_inventory.py --micro-only
+
+Бенчмарк пишет в БД (user_inventory, сводка, curse, steamapis_items) —
+запускать только на отдельной базе.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import base64
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+PAGE_SIZE = 2000                      # ассетов на страницу, как у steamapis
+RUB_PER = {"USD": 82.74, "EUR": 90.1, "CNY": 11.4, "TRY": 2.15, "KZT": 0.161, "RUB": 1.0}
+
+
+# ───── снимки ─────────────────────────────────────────
+def load_fixtures() -> dict[str, list[dict]]:
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "inventoryJson", "*.json"))):
+        name = os.path.basename(path)[:-len(".json")]
+        if not name.isdigit():
+            continue                  # файлы JSON-кэша: <steamid>.<ключ>.json
+        try:
+            with open(path, encoding="utf-8") as f:
+                fixtures[name] = json.load(f)
+        except ValueError:
+            print(f"skip {name}: invalid JSON", file=sys.stderr)
+    return fixtures
+
+
+def _tags(item: dict) -> list[dict]:
+    name = item["market_hash_name"]
+    kind, _, rest = name.partition(" | ")
+    tags = [
+        {"category": "Type", "internal_name": kind, "localized_category_name": "Type",
+         "localized_tag_name": kind},
+        {"category": "Quality", "internal_name": "normal", "localized_category_name": "Category",
+         "localized_tag_name": "Normal"},
+    ]
+    if "(" in rest:
+        exterior = rest[rest.rindex("(") + 1:].rstrip(")")
+        tags.append({"category": "Exterior", "internal_name": exterior,
+                     "localized_category_name": "Exterior", "localized_tag_name": exterior})
+    return tags
+
+
+def build_pages(steamid: str, items: list[dict]) -> dict[tuple[str, int, str], bytes]:
+    """{(steamid, appid, start_assetid): тело страницы}; start_assetid "" — первая страница."""
+    by_app: dict[int, list[tuple[dict, dict]]] = {}
+    for idx, item in enumerate(items):
+        classid, instanceid = str(1_000_000 + idx), "0"
+        desc = {
+            "appid": item["appid"], "classid": classid, "instanceid": instanceid,
+            "market_hash_name": item["market_hash_name"], "tradable": item["tradable"],
+            "marketable": item["marketable"], "type": item["market_hash_name"].partition(" | ")[0],
+            "icon_url": item["icon_url"], "tags": _tags(item),
+        }
+        assets = by_app.setdefault(item["appid"], [])
+        for _ in range(max(1, int(item["count"]))):
+            asset = {
+                "appid": item["appid"], "contextid": "2",
+                "assetid": str(10_000_000_000 + len(assets)),
+                "classid": classid, "instanceid": instanceid, "amount": "1",
+            }
+            assets.append((asset, desc))
+
+    pages = {}
+    for appid, assets in by_app.items():
+        start = ""
+        for i in range(0, len(assets), PAGE_SIZE):
+            chunk = assets[i:i + PAGE_SIZE]
+            descs = {id(d): d for _, d in chunk}
+            more = i + PAGE_SIZE < len(assets)
+            body = {
+                "assets": [a for a, _ in chunk],
+                "descriptions": list(descs.values()),
+                "total_inventory_count": len(assets),
+                "success": 1,
+            }
+            if more:
+                body["more_items"] = 1
+                body["last_assetid"] = chunk[-1][0]["assetid"]
+            pages[(steamid, appid, start)] = json.dumps(body).encode()
+            start = body.get("last_assetid", "")
+    return pages
+
+
+# ───── заглушка steamapis ─────────────────────────────
+def start_stub(pages: dict) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            # /steam/inventory/{steamid}/{appid}/2
+            seg = parts.path.strip("/").split("/")
+            start = parse_qs(parts.query).get("start_assetid", [""])[0]
+            body = None
+            if len(seg) == 5 and seg[:2] == ["steam", "inventory"]:
+                body = pages.get((seg[2], int(seg[3]), start))
+            self.send_response(200 if body is not None else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ───── замеры ─────────────────────────────────────────
+def percentiles(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {
+        "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+async def run_load(call, targets: list, total: int, concurrency: int) -> dict:
+    """total вызовов call(target) по кругу targets, не больше concurrency одновременно."""
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            ok = await call(targets[i % len(targets)])
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total, "concurrency": concurrency, "errors": errors,
+        "rps": round(total / elapsed, 2), **percentiles(latencies),
+    }
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+# ───── микропути ──────────────────────────────────────
+def bench_micro(fixtures: dict, repeat: int) -> dict:
+    import inventory
+    import item_steam_apis
+    import pricing
+    import rates
+    from routers import inventory_json
+
+    items = [item for inv in fixtures.values() for item in inv]
+    fx = rates.compute_factors({k: v for k, v in RUB_PER.items() if k != "RUB"})
+
+    tags = [_tags(item) for item in items]
+    rows = [
+        {**item, "updated_at": datetime.strptime(item["updated_at"], "%Y-%m-%d %H:%M:%S"),
+         "price_usd": item["prices"]["USD"]}
+        for item in items
+    ]
+    prices, prices_full = pricing.price_rows(
+        [r["price_usd"] for r in rows], [r["count"] for r in rows], fx
+    )
+    market = [
+        {
+            "market_hash_name": item["market_hash_name"], "nameID": "1",
+            "prices": {
+                "latest": item["prices"]["USD"], "min": item["prices"]["USD"],
+                "avg": item["prices"]["USD"], "max": item["prices"]["USD"],
+                "mean": item["prices"]["USD"], "median": item["prices"]["USD"],
+                "safe_ts": {"last_24h": item["prices"]["USD"], "last_7d": item["prices"]["USD"]},
+                "sold": {"last_24h": 3, "last_7d": 20, "avg_daily_volume": 3},
+                "unstable": False, "unstable_reason": False,
+            },
+            "updated_at": 1745700000000, "image": item["icon_url"],
+        }
+        for item in items
+    ]
+
+    def per_call(fn, n):
+        return round(best_of(fn, repeat) / n * 1e9, 1)
+
+    return {
+        "items": len(items),
+        "parse_tags_ns": per_call(lambda: [inventory.parse_tags(t) for t in tags], len(tags)),
+        "compose_item_json_ns": per_call(
+            lambda: [inventory_json._compose_item_json(r, p, pf)
+                     for r, p, pf in zip(rows, prices, prices_full)],
+            len(rows),
+        ),
+        "normalize_item_ns": per_call(
+            lambda: [item_steam_apis.normalize_item(730, m) for m in market], len(market)
+        ),
+    }
+
+
+# ───── сквозные сценарии ──────────────────────────────
+async def seed_db(conn, fixtures: dict) -> None:
+    """Курсы и цены из снимков — чтобы сводка и /getjsoninv считали настоящие суммы."""
+    import curse_sync
+
+    await curse_sync.store_rates(conn, {k: v for k, v in RUB_PER.items() if k != "RUB"})
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS steamapis_items (
+            appid INT, market_hash_name TEXT,
+            prise_24h NUMERIC, prise_7d NUMERIC, avg NUMERIC
+        )
+    """)
+    await conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS steamapis_items_key_idx
+            ON steamapis_items (appid, market_hash_name)
+    """)
+    prices = {
+        (item["appid"], item["market_hash_name"]): item["prices"]["USD"]
+        for inv in fixtures.values() for item in inv
+    }
+    await conn.executemany(
+        """
+        INSERT INTO steamapis_items (appid, market_hash_name, prise_24h, prise_7d, avg)
+        VALUES ($1, $2, $3, $3, $3)
+        ON CONFLICT (appid, market_hash_name) DO UPDATE SET prise_24h = EXCLUDED.prise_24h
+        """,
+        [(appid, name, Decimal(str(p))) for (appid, name), p in prices.items()],
+    )
+
+
+def session_cookie(secret: str, session: dict) -> str:
+    # тот же формат, что у starlette SessionMiddleware
+    from itsdangerous import TimestampSigner
+
+    data = base64.b64encode(json.dumps(session).encode("utf-8"))
+    return TimestampSigner(secret).sign(data).decode("utf-8")
+
+
+def purge_json_cache(steamid: str) -> None:
+    import json_cache
+
+    for name in os.listdir(json_cache.JSON_DIR):
+        m = json_cache.CACHE_FILE_RE.match(name)
+        if m and m.group(1) == steamid:
+            json_cache._remove(os.path.join(json_cache.JSON_DIR, name))
+
+
+async def bench_e2e(fixtures: dict, args) -> dict:
+    import asyncpg
+    import httpx
+
+    import inventory
+    import main
+    import scheduler
+    import settings
+
+    pages = {}
+    for steamid, items in fixtures.items():
+        pages.update(build_pages(steamid, items))
+    stub = start_stub(pages)
+    host, port = stub.server_address
+
+    inventory.BASE_URL = f"http://{host}:{port}/steam/inventory/{{steamid}}/{{appid}}/2?api_key=bench"
+    inventory.FRESH_SECONDS = 0           # каждый запрос — полная загрузка
+    scheduler.ENABLED = False
+
+    # --dsn уходит в lifespan через app.state, settings не трогаем
+    main.app.state.db_dsn = args.dsn
+    conn = await (asyncpg.connect(args.dsn) if args.dsn else asyncpg.connect(**settings.DB_CONFIG))
+    try:
+        await seed_db(conn, fixtures)
+    finally:
+        await conn.close()
+
+    cookie = session_cookie(main.SESSION_SECRET, {"steamid": next(iter(fixtures))})
+    inv_targets = sorted({(steamid, appid) for steamid, appid, _ in pages})
+    steamids = list(fixtures)
+    etags: dict[str, str] = {}
+
+    results = {"fixtures": {s: len(items) for s, items in fixtures.items()}}
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="https://bench", headers={"Cookie": f"session={cookie}"},
+            timeout=None,
+        ) as client:
+
+            async def load_inventory(target):
+                steamid, appid = target
+                resp = await client.get(f"/inventory/{steamid}/{appid}")
+                return resp.status_code == 200
+
+            async def getjsoninv(steamid, purge=False, conditional=False):
+                if purge:
+                    purge_json_cache(steamid)
+                headers = {"If-None-Match": etags.get(steamid, "")} if conditional else {}
+                resp = await client.get(f"/getjsoninv/{steamid}", headers=headers)
+                if resp.status_code == 200:
+                    etags[steamid] = resp.headers["ETag"]
+                return resp.status_code in ((304,) if conditional else (200,))
+
+            async def getjsoninv_pages(steamid, first_only=False):
+                # весь инвентарь страницами по курсору (или только первая)
+                params = {"sort": "total", "limit": 100}
+                while True:
+                    resp = await client.get(f"/getjsoninv/{steamid}", params=params)
+                    if resp.status_code != 200:
+                        return False
+                    cursor = resp.json()["next_cursor"]
+                    if first_only or cursor is None:
+                        return True
+                    params["cursor"] = cursor
+
+            # прогрев: схема, сводки, первый JSON-кэш
+            for target in inv_targets:
+                await load_inventory(target)
+
+            results["inventory"] = await run_load(
+                load_inventory, inv_targets, args.requests, args.concurrency
+            )
+            results["getjsoninv_cold"] = await run_load(
+                lambda s: getjsoninv(s, purge=True), steamids, args.requests, args.concurrency
+            )
+            results["getjsoninv_cached"] = await run_load(
+                getjsoninv, steamids, args.requests, args.concurrency
+            )
+            results["getjsoninv_304"] = await run_load(
+                lambda s: getjsoninv(s, conditional=True), steamids, args.requests, args.concurrency
+            )
+            results["getjsoninv_first_page"] = await run_load(
+                lambda s: getjsoninv_pages(s, first_only=True), steamids, args.requests, args.concurrency
+            )
+            results["getjsoninv_all_pages"] = await run_load(
+                getjsoninv_pages, steamids, args.requests, args.concurrency
+            )
+
+    stub.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=10, help="повторы микрозамеров")
+    parser.add_argument("--dsn", help="Postgres вместо [database] из config.ini")
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--out", help="файл для JSON-результата")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    result = {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "micro": bench_micro(fixtures, args.repeat),
+    }
+    if not args.micro_only:
+        result["e2e"] = asyncio.run(bench_e2e(fixtures, args))
+
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
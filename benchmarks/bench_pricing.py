@@ -0,0 +1,80 @@
+# benchmarks/bench_pricing.py
+"""
+Микробенчмарк пересчёта цен: поштучный price_row против пакетного
+price_rows на позициях из inventoryJson/*.json. Перед замером
+проверяет, что оба пути дают одинаковый результат.
+
+    python benchmarks/bench_pricing.py [--repeat 20]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import pricing  # noqa: E402
+
+# курсы в духе таблицы curse: RUB за единицу валюты → коэффициенты от USD
+RUB_PER = {"USD": 82.74, "EUR": 90.1, "CNY": 11.4, "TRY": 2.15, "KZT": 0.161}
+FX = {"USD": 1.0, "RUB": RUB_PER["USD"]}
+FX.update({cur: RUB_PER["USD"] / rub for cur, rub in RUB_PER.items() if cur != "USD"})
+
+
+def load_fixture_columns():
+    prices, counts = [], []
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "inventoryJson", "*.json"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                items = json.load(f)
+        except ValueError:
+            # обрезанный снимок (до атомарной записи такое случалось) — пропускаем
+            print(f"skip {os.path.basename(path)}: invalid JSON", file=sys.stderr)
+            continue
+        for item in items:
+            prices.append(float(item["prices"]["USD"]))
+            counts.append(int(item["count"]))
+    return prices, counts
+
+
+def per_row(prices, counts):
+    pairs = [pricing.price_row(p, c, FX) for p, c in zip(prices, counts)]
+    return [p for p, _ in pairs], [f for _, f in pairs]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    prices, counts = load_fixture_columns()
+    if per_row(prices, counts) != pricing.price_rows(prices, counts, FX):
+        raise SystemExit("price_rows расходится с поштучным расчётом")
+
+    row_s = best_of(lambda: per_row(prices, counts), args.repeat)
+    batch_s = best_of(lambda: pricing.price_rows(prices, counts, FX), args.repeat)
+
+    print(json.dumps({
+        "items": len(prices),
+        "currencies": len(FX),
+        "numpy": pricing.np is not None,
+        "per_row_ms": round(row_s * 1000, 3),
+        "batched_ms": round(batch_s * 1000, 3),
+        "speedup": round(row_s / batch_s, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,33 @@
-import psycopg2
-import requests
+import asyncio
+import statistics
 from datetime import datetime
+from decimal import Decimal
 import logging
 import os
 import re
 
-# === ЛОГГЕР ===
-LOG_DIR = "/root/Site/logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, "curse_sync.log"),
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+import db
+import http_client
+from settings import ROOT_DIR
+
+LOG_DIR = os.path.join(ROOT_DIR, "logs")
 
 # === НАСТРОЙКИ ===
 API_URL = "https://steamcommunity.com/market/priceoverview/"
 APP_ID = 730
-ITEM_NAME = "Operation Bravo Case"
+
+# курс валюты — медиана отношений цен по нескольким стабильным кейсам,
+# чтобы один шумный лот не перекашивал все цены
+REFERENCE_ITEMS = [
+    "Operation Bravo Case",
+    "Chroma 2 Case",
+    "Falchion Case",
+]
+REQUEST_TIMEOUT = 10
+
+# Steam режет priceoverview примерно на 20 запросах в минуту;
+# если в [ratelimit] хост не задан — щадящий лимит по умолчанию
+http_client.RATE_LIMITS.setdefault("steamcommunity.com", (0.3, 3))
 
 CURRENCIES = {
     "USD": 1,
@@ -28,50 +38,75 @@ CURRENCIES = {
     "RUB": 5
 }
 
-DB_CONFIG = {
-    "dbname": "steaminventory_db",
-    "user": "steamuser",
-    "password": "MySecurePostgres123!",
-    "host": "localhost",
-    "port": 5432
-}
-
-def connect_db():
-    return psycopg2.connect(**DB_CONFIG)
-
-def create_table(cur):
-    cur.execute("""
+async def create_table(conn):
+    # без очистки: курсы заменяются upsert'ом одной транзакцией в store_rates(),
+    # читатели никогда не видят пустую таблицу
+    await conn.execute("""
         CREATE TABLE IF NOT EXISTS curse (
             valute TEXT PRIMARY KEY,
             curse NUMERIC NOT NULL,
             time TIMESTAMP NOT NULL
         );
     """)
-    cur.execute("DELETE FROM curse;")
-    logging.info("✅ Таблица curse создана и очищена")
+    logging.info("✅ Таблица curse на месте")
 
-def save_rate(cur, valute, curse, time_str):
-    cur.execute("""
+async def save_rate(conn, valute, curse, time):
+    await conn.execute("""
         INSERT INTO curse (valute, curse, time)
-        VALUES (%s, %s, %s)
+        VALUES ($1, $2, $3)
         ON CONFLICT (valute) DO UPDATE SET
             curse = EXCLUDED.curse,
             time = EXCLUDED.time;
-    """, (valute, curse, time_str))
+    """, valute, Decimal(str(curse)), time)
     logging.info(f"💾 Сохранено: {valute} = {curse} RUB")
 
-def fetch_price(currency_code):
+async def fetch_price(currency_code, item_name):
     params = {
         "currency": currency_code,
         "country": "us",
         "appid": APP_ID,
-        "market_hash_name": ITEM_NAME,
+        "market_hash_name": item_name,
         "format": "json"
     }
-    response = requests.get(API_URL, params=params)
+    # таймаут, лимит хоста и повторы на 429/5xx — в http_client
+    response = await http_client.get(API_URL, params=params, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
     return response.json()
 
+async def fetch_item_prices(valute, code):
+    """Цены всех REFERENCE_ITEMS в одной валюте; неудачные предметы пропускаются."""
+    async def one(item_name):
+        try:
+            return item_name, extract_median_price(await fetch_price(code, item_name))
+        except Exception as e:
+            logging.error(f"❌ {valute} / {item_name}: {e}")
+            return item_name, None
+
+    results = await asyncio.gather(*(one(name) for name in REFERENCE_ITEMS))
+    return {name: price for name, price in results if price}
+
+async def fetch_rates():
+    """{валюта: рублей за единицу} по всем CURRENCIES, запросы идут параллельно."""
+    results = await asyncio.gather(
+        *(fetch_item_prices(valute, code) for valute, code in CURRENCIES.items())
+    )
+
+    prices = dict(zip(CURRENCIES, results))
+    rub = prices["RUB"]
+    rates = {}
+
+    for valute, item_prices in prices.items():
+        if valute == "RUB":
+            continue
+        ratios = [rub[name] / price for name, price in item_prices.items() if name in rub]
+        if not ratios:
+            logging.error(f"❌ Нет ни одной пары цен RUB/{valute}")
+            continue
+        rates[valute] = round(statistics.median(ratios), 3)
+        logging.info(f"📈 {valute}: медиана по {len(ratios)} предметам")
+
+    return rates
+
 def extract_median_price(data):
     if not data.get("success"):
         raise ValueError("Данные от API не являются успешными")
@@ -99,37 +134,56 @@ def extract_median_price(data):
         raise ValueError(f"Не удалось преобразовать цену: {raw} → {cleaned}")
 
 
+async def store_rates(conn, rates):
+    now = datetime.utcnow().replace(microsecond=0)
+    async with conn.transaction():
+        await create_table(conn)
+        for valute, rate in rates.items():
+            await save_rate(conn, valute, rate, now)
+        await conn.execute("NOTIFY curse_updated")
 
-def main():
+
+async def sync():
+    """
+    Одно обновление curse. Внутри приложения его запускает scheduler на
+    общих пуле БД и HTTP-клиенте; возвращает False, если курсы не записаны.
+    """
     logging.info("🚀 Запуск обновления таблицы curse")
+    # сначала собираем все курсы, к БД идём только с готовым набором
+    rates = await fetch_rates()
+
+    if "USD" not in rates:
+        # без USD курсы бесполезны для API — оставляем прежние
+        logging.error("❌ Нет курса USD, таблица curse не тронута")
+        return False
+
+    async with db.acquire() as conn:
+        await store_rates(conn, rates)
+    logging.info("✅ Данные записаны в базу")
+    return True
+
+
+async def _run_standalone():
+    await db.init_pool()
+    await http_client.start()
+    try:
+        await sync()
+    finally:
+        await http_client.stop()
+        await db.close_pool()
+
+
+def main():
     try:
-        conn = connect_db()
-        cur = conn.cursor()
-
-        create_table(cur)
-
-        rub_data = fetch_price(CURRENCIES["RUB"])
-        rub_price = extract_median_price(rub_data)
-
-        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-
-        for valute, code in CURRENCIES.items():
-            if valute == "RUB":
-                continue
-            try:
-                data = fetch_price(code)
-                val_price = extract_median_price(data)
-                rate = round(rub_price / val_price, 3)
-                save_rate(cur, valute, rate, now)
-            except Exception as e:
-                logging.error(f"❌ Ошибка при обработке {valute}: {e}")
-
-        conn.commit()
-        logging.info("✅ Данные записаны в базу")
-        cur.close()
-        conn.close()
+        asyncio.run(_run_standalone())
     except Exception as e:
         logging.critical(f"🔥 Критическая ошибка: {e}")
 
 if __name__ == "__main__":
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(LOG_DIR, "curse_sync.log"),
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
     main()
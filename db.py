@@ -0,0 +1,151 @@
+# db.py
+"""
+Общий asyncpg.Pool приложения.
+
+Пул создаётся в lifespan main.py и закрывается при остановке; роутеры
+получают его через Depends(db.get_pool), а соединения берут через
+db.acquire() — так учитывается время ожидания свободного соединения.
+
+Аренды (try_lease/release_lease) — взаимное исключение между воркерами
+без удержания соединения: строка в таблице leases со сроком истечения.
+Session-level advisory-lock держит соединение пула всё время работы
+владельца и каждого ждущего; аренда занимает его только на один запрос.
+"""
+import time
+import uuid
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import asyncpg
+
+from settings import DB_CONFIG, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+
+_pool: asyncpg.Pool | None = None
+_connect_args: dict = DB_CONFIG        # [database] из config.ini или dsn из init_pool
+
+LEASES_SQL = """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL
+    )
+"""
+
+# накопительная статистика ожидания соединений
+_acquire_count = 0
+_wait_total = 0.0
+_wait_max = 0.0
+
+
+async def init_pool(dsn: str | None = None) -> asyncpg.Pool:
+    """dsn — другая база вместо [database] (бенчмарки, отдельные стенды)."""
+    global _pool, _connect_args
+    _connect_args = {"dsn": dsn} if dsn else DB_CONFIG
+    _pool = await asyncpg.create_pool(
+        **_connect_args,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+    )
+    async with _pool.acquire() as conn:
+        await conn.execute(LEASES_SQL)
+    logging.info(f"🔌 Пул БД создан ({DB_POOL_MIN_SIZE}…{DB_POOL_MAX_SIZE})")
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logging.info("🔌 Пул БД закрыт")
+
+
+async def connect() -> asyncpg.Connection:
+    """Отдельное соединение вне пула — для долгоживущего LISTEN."""
+    return await asyncpg.connect(**_connect_args)
+
+
+def get_pool() -> asyncpg.Pool:
+    """Зависимость FastAPI; вне запроса можно звать напрямую."""
+    if _pool is None:
+        raise RuntimeError("DB pool is not initialized")
+    return _pool
+
+
+@asynccontextmanager
+async def acquire(pool: asyncpg.Pool | None = None):
+    global _acquire_count, _wait_total, _wait_max
+    pool = pool or get_pool()
+
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        waited = time.perf_counter() - started
+        _acquire_count += 1
+        _wait_total += waited
+        _wait_max = max(_wait_max, waited)
+        yield conn
+
+
+def utc_naive(dt: datetime | None) -> datetime | None:
+    """Время для колонок TIMESTAMP: история (цены, портфели) хранится в UTC без зоны."""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def fetch_or_empty(pool: asyncpg.Pool | None, sql: str, *args) -> list:
+    """fetch по таблице, которой может ещё не быть (история ещё ни разу не записывалась)."""
+    async with acquire(pool) as conn:
+        try:
+            return await conn.fetch(sql, *args)
+        except asyncpg.UndefinedTableError:
+            return []
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False}
+
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "initialized":  True,
+        "min_size":     _pool.get_min_size(),
+        "max_size":     _pool.get_max_size(),
+        "size":         size,
+        "acquired":     size - idle,
+        "idle":         idle,
+        "acquires":     _acquire_count,
+        "wait_avg_ms":  round(_wait_total / _acquire_count * 1000, 3) if _acquire_count else 0.0,
+        "wait_max_ms":  round(_wait_max * 1000, 3),
+    }
+
+
+# === Аренды ===
+async def try_lease(name: str, ttl: float, pool: asyncpg.Pool | None = None) -> str | None:
+    """
+    Берёт аренду name на ttl секунд; возвращает токен владельца или None,
+    если аренда занята и ещё не истекла. Просроченная аренда (владелец
+    упал) перехватывается.
+    """
+    token = uuid.uuid4().hex
+    async with acquire(pool) as conn:
+        owner = await conn.fetchval(
+            """
+            INSERT INTO leases (name, owner, expires_at)
+            VALUES ($1, $2, now() + make_interval(secs => $3))
+            ON CONFLICT (name) DO UPDATE
+                SET owner = EXCLUDED.owner, expires_at = EXCLUDED.expires_at
+                WHERE leases.expires_at < now()
+            RETURNING owner
+            """,
+            name, token, float(ttl),
+        )
+    return token if owner == token else None
+
+
+async def release_lease(name: str, token: str, pool: asyncpg.Pool | None = None) -> None:
+    """Снимает аренду, если она всё ещё наша."""
+    async with acquire(pool) as conn:
+        await conn.execute("DELETE FROM leases WHERE name = $1 AND owner = $2", name, token)
@@ -0,0 +1,150 @@
+# http_client.py
+"""
+Общий httpx.AsyncClient приложения.
+
+Один клиент на процесс (создаётся в lifespan main.py): пул keep-alive
+соединений и HTTP/2, если установлен пакет h2. Перед каждым запросом
+берётся токен из bucket'а хоста — steamapis тарифицирует и режет по
+вызовам; на 429/5xx и сетевые ошибки — повтор с джиттером.
+"""
+import time
+import random
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+from settings import config
+
+HTTP2_WANTED = config.getboolean("http", "http2", fallback=True)
+try:
+    import h2  # noqa: F401  — нужен httpx для HTTP/2 (httpx[http2])
+    HTTP2 = HTTP2_WANTED
+except ImportError:
+    HTTP2 = False
+
+# === НАСТРОЙКИ ===
+TIMEOUT = config.getfloat("http", "timeout", fallback=30)
+MAX_CONNECTIONS = config.getint("http", "max_connections", fallback=50)
+MAX_KEEPALIVE = config.getint("http", "max_keepalive", fallback=20)
+RETRIES = config.getint("http", "retries", fallback=3)
+BACKOFF_BASE = config.getfloat("http", "backoff_base", fallback=0.5)
+BACKOFF_MAX = config.getfloat("http", "backoff_max", fallback=10)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# лимиты по хостам: "<host> = <запросов/с>[, <burst>]", секция [ratelimit]
+RATE_LIMITS: dict[str, tuple[float, int]] = {}
+if config.has_section("ratelimit"):
+    for host, spec in config.items("ratelimit"):
+        rate, _, burst = spec.partition(",")
+        RATE_LIMITS[host] = (float(rate), int(burst or max(1, float(rate))))
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше burst."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+_client: httpx.AsyncClient | None = None
+_buckets: dict[str, TokenBucket] = {}
+
+
+# === Жизненный цикл ===
+async def start() -> httpx.AsyncClient:
+    global _client
+    if HTTP2_WANTED and not HTTP2:
+        logging.warning("⚠️ http2 = true, но пакет h2 не установлен — работаем по HTTP/1.1")
+    _client = httpx.AsyncClient(
+        http2=HTTP2,
+        timeout=TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+        ),
+    )
+    logging.info(f"🌐 HTTP-клиент создан (http2={HTTP2})")
+    return _client
+
+
+async def stop() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client is not initialized")
+    return _client
+
+
+# === Запросы ===
+def _bucket_for(host: str) -> TokenBucket | None:
+    if host not in RATE_LIMITS:
+        return None
+    if host not in _buckets:
+        _buckets[host] = TokenBucket(*RATE_LIMITS[host])
+    return _buckets[host]
+
+
+def _backoff(attempt: int, resp: httpx.Response | None) -> float:
+    if resp is not None and resp.status_code == 429:
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    delay = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.5)
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Запрос через общий клиент с лимитом хоста и повторами. Возвращает
+    последний ответ (raise_for_status — на стороне вызывающего) или
+    пробрасывает последнюю httpx.RequestError.
+    """
+    client = get_client()
+    bucket = _bucket_for(urlsplit(url).hostname or "")
+
+    for attempt in range(RETRIES + 1):
+        if bucket is not None:
+            await bucket.acquire()
+
+        resp = None
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.RequestError as e:
+            if attempt == RETRIES:
+                raise
+            logging.warning(f"🔁 {method} {urlsplit(url).hostname}: {e!r}, повтор {attempt + 1}")
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                return resp
+            logging.warning(
+                f"🔁 {method} {urlsplit(url).hostname}: HTTP {resp.status_code}, повтор {attempt + 1}"
+            )
+
+        await asyncio.sleep(_backoff(attempt, resp))
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
@@ -1,19 +1,26 @@
 import os
+import sys
+import time
+import uuid
+import random
+import asyncio
 import logging
-import configparser
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from urllib.parse import urlsplit
 
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
 import asyncpg
-import httpx
 
-router = APIRouter()
+import db
+import http_client
+import metrics
+import portfolio
+from portfolio import PRICE_EXPR
+from settings import config
 
-# === КОНФИГ ===
-config = configparser.ConfigParser()
-config.read(os.path.join(os.path.dirname(__file__), "config.ini"))
+router = APIRouter()
 
 # === НАСТРОЙКИ ===
 API_KEY = config["steam"]["api_key"]
@@ -21,14 +28,6 @@ BASE_URL = (
     "https://api.steamapis.com/steam/inventory/{steamid}/{appid}/2?api_key=" + API_KEY
 )
 
-DB_CONFIG = {
-    "user":     config["database"]["user"],
-    "password": config["database"]["password"],
-    "database": config["database"]["dbname"],
-    "host":     config["database"]["host"],
-    "port":     config.getint("database", "port"),
-}
-
 LOG_DIR = "./logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 logging.basicConfig(
@@ -40,6 +39,45 @@ logging.basicConfig(
 # константа для сдвига UTC→МСК
 MSK_OFFSET = timedelta(hours=3)
 
+# порядок колонок строки инвентаря; поля предмета не дублируются по
+# ассетам — они в item_descriptions по ключу (appid, classid, instanceid)
+INVENTORY_COLUMNS = ("steamid", "appid", "assetid", "classid", "instanceid", "updated_at")
+# строка staging: та же строка с меткой загрузки впереди
+STAGE_COLUMNS = ("load_id",) + INVENTORY_COLUMNS
+DESCRIPTION_COLUMNS = (
+    "appid", "classid", "instanceid", "market_hash_name", "tradable",
+    "marketable", "type", "categories", "tags", "icon_url",
+)
+
+# single-flight: одна загрузка на (steamid, appid), повтор не раньше FRESH_SECONDS;
+# режим "lease" дополнительно сериализует загрузку между воркерами uvicorn
+# арендой в таблице leases (db.try_lease): ждущие воркеры соединение не держат;
+# "advisory" — прежнее имя режима, принимается как синоним
+SINGLEFLIGHT_MODE = config.get("inventory", "singleflight", fallback="local").strip().lower()
+if SINGLEFLIGHT_MODE == "advisory":
+    SINGLEFLIGHT_MODE = "lease"
+FRESH_SECONDS = config.getint("inventory", "fresh_seconds", fallback=30)
+LEASE_SECONDS = config.getint("inventory", "lease_seconds", fallback=300)
+LEASE_WAIT = config.getint("inventory", "lease_wait_seconds", fallback=120)
+
+# сколько скачанных страниц может ждать записи в staging
+PREFETCH_PAGES = config.getint("inventory", "prefetch_pages", fallback=1)
+
+SUPPORTED_APPS = {730, 570, 440, 252490}                     # CS2, Dota 2, TF2, Rust
+
+# пакетная загрузка: общий на процесс лимит одновременных выгрузок
+# из steamapis и максимум пар (steamid, appid) в одном запросе
+BATCH_CONCURRENCY = config.getint("inventory", "batch_concurrency", fallback=4)
+BATCH_MAX_ITEMS = config.getint("inventory", "batch_max_items", fallback=20)
+
+# сколько описаний, уже записанных в item_descriptions, помнит процесс
+DESCRIPTION_CACHE_SIZE = config.getint("inventory", "description_cache", fallback=50000)
+
+_inflight: dict[tuple[str, int], asyncio.Task] = {}
+_loaded_at: dict[tuple[str, int], float] = {}
+_descriptions: OrderedDict[tuple[int, str, str], "Description"] = OrderedDict()
+_batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
 # === Вспомогательные функции ===
 def parse_tags(tags: list) -> tuple[str, str]:
     cats, vals = [], []
@@ -50,138 +88,750 @@ def parse_tags(tags: list) -> tuple[str, str]:
     return ";".join(cats), ";".join(vals)
 
 
-async def load_and_store_inventory(steamid: str, appid: int) -> bool:
+class Description:
+    """
+    Описание предмета (appid, classid, instanceid), разобранное один раз:
+    все ассеты с этим ключом ссылаются на одну запись. Повторяющиеся
+    между предметами строки (type, категории, теги) интернируются;
+    имя и иконка уникальны для описания и делятся через саму запись.
+    """
+    __slots__ = DESCRIPTION_COLUMNS + ("fingerprint",)
+
+    def __init__(self, appid: int, d: dict):
+        self.fingerprint = _fingerprint(d)
+        cat_str, val_str = parse_tags(d.get("tags", []))
+        self.appid = appid
+        self.classid = d["classid"]
+        self.instanceid = d["instanceid"]
+        self.market_hash_name = d.get("market_hash_name")
+        self.tradable = d.get("tradable")
+        self.marketable = d.get("marketable")
+        self.type = _intern(d.get("type"))
+        self.categories = sys.intern(cat_str)
+        self.tags = sys.intern(val_str)
+        self.icon_url = d.get("icon_url")
+
+    def as_record(self) -> tuple:
+        return tuple(getattr(self, col) for col in DESCRIPTION_COLUMNS)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _fingerprint(d: dict) -> tuple:
+    """
+    Сырые скалярные поля описания — сравниваются без разбора тегов.
+    Теги и категории в отпечаток не входят: при смене описания класса
+    Steam выдаёт новый classid, и это уже другой ключ.
+    """
+    return (
+        d.get("market_hash_name"), d.get("tradable"), d.get("marketable"),
+        d.get("type"), d.get("icon_url"),
+    )
+
+
+def _describe(appid: int, d: dict, new: dict) -> Description:
+    """
+    Запись описания: уже известная процессу с тем же отпечатком
+    переиспользуется без разбора, новая или изменившаяся разбирается и
+    попадает в new — её нужно записать в item_descriptions.
+    """
+    key = (appid, d["classid"], d["instanceid"])
+    known = _descriptions.get(key)
+    if known is not None and known.fingerprint == _fingerprint(d):
+        _descriptions.move_to_end(key)
+        return known
+    desc = new[key] = Description(appid, d)
+    return desc
+
+
+def _remember(new: dict) -> None:
+    """Описания из закоммиченной транзакции — в кэш процесса (LRU)."""
+    _descriptions.update(new)
+    while len(_descriptions) > DESCRIPTION_CACHE_SIZE:
+        _descriptions.popitem(last=False)
+
+
+class InventoryFetchError(Exception):
+    pass
+
+
+async def fetch_inventory_pages(steamid: str, appid: int):
     """
-    Загружает инвентарь частями (по 2 000 предметов), объединяет результаты
-    и сохраняет в таблицу user_inventory.
+    Страницы инвентаря steamapis (по 2 000 предметов) по курсору
+    start_assetid. Ошибка запроса — InventoryFetchError.
     """
     start_assetid: str | None = None           # курсор постраничной выборки
-    all_assets: list[dict] = []
-    descriptions: dict[tuple[str, str], dict] = {}
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        while True:
-            url = BASE_URL.format(steamid=steamid, appid=appid)
-            if start_assetid:
-                url += f"&start_assetid={start_assetid}"
+    while True:
+        url = BASE_URL.format(steamid=steamid, appid=appid)
+        if start_assetid:
+            url += f"&start_assetid={start_assetid}"
 
-            logging.info(
-                f"📥 Запрос инвент: steamid={steamid}, appid={appid}, start={start_assetid or '0'}"
-            )
+        logging.info(
+            f"📥 Запрос инвент: steamid={steamid}, appid={appid}, start={start_assetid or '0'}"
+        )
 
-            try:
-                resp = await client.get(url)
-                resp.raise_for_status()
-                data = resp.json()
-            except Exception as e:
-                logging.error(f"❌ Ошибка загрузки с API: {e}")
-                return False
+        try:
+            with metrics.UPSTREAM_PAGE_SECONDS.time(appid=appid):
+                resp = await http_client.get(url)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            raise InventoryFetchError(f"Ошибка загрузки с API: {e}") from e
 
-            # аккумулируем данные
-            all_assets.extend(data.get("assets", []))
-            for d in data.get("descriptions", []):
-                descriptions[(d["classid"], d["instanceid"])] = d
+        yield data
 
-            # проверяем, есть ли ещё предметы
-            if data.get("more_items") and data.get("last_assetid"):
-                start_assetid = data["last_assetid"]
-            else:
-                break       # получили всё
+        # проверяем, есть ли ещё предметы
+        if data.get("more_items") and data.get("last_assetid"):
+            start_assetid = data["last_assetid"]
+        else:
+            break       # получили всё
 
-    if not all_assets:
-        logging.warning("⚠️ Нет предметов для вставки")
-        return False
 
-    # московское время фиксируем после полной выгрузки
-    now = datetime.utcnow() + MSK_OFFSET
-    rows = []
+async def _prefetch(pages, depth: int = PREFETCH_PAGES):
+    """
+    Качает следующие страницы, пока обрабатывается текущая. В памяти не
+    больше depth готовых страниц плюс одна в загрузке.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+    done = object()
 
-    for asset in all_assets:
-        key = (asset["classid"], asset["instanceid"])
-        desc = descriptions.get(key)
-        if not desc:
+    async def produce():
+        try:
+            async for page in pages:
+                await queue.put(page)
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (page := await queue.get()) is not done:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+def _page_rows(
+    steamid: str,
+    appid: int,
+    page: dict,
+    descriptions: dict,
+    new: dict,
+    pending: list,
+    load_id: str,
+    now: datetime,
+) -> list[tuple]:
+    """
+    Строки user_inventory_stage (порядок STAGE_COLUMNS) для ассетов страницы.
+    Описания разбираются один раз на (classid, instanceid) и копятся между
+    страницами; ассеты без описания откладываются в pending до конца
+    выгрузки. Дубли assetid между страницами отсекает _apply_stage.
+    """
+    for d in page.get("descriptions", []):
+        key = (d["classid"], d["instanceid"])
+        if key not in descriptions:
+            descriptions[key] = _describe(appid, d, new)
+
+    rows = []
+    for asset in page.get("assets", []):
+        desc = descriptions.get((asset["classid"], asset["instanceid"]))
+        if desc is None:
+            pending.append(asset)
             continue
+        rows.append((load_id, steamid, appid, asset["assetid"], desc.classid, desc.instanceid, now))
+    return rows
 
-        cat_str, val_str = parse_tags(desc.get("tags", []))
-
-        rows.append(
-            (
-                steamid,
-                asset["appid"],
-                asset["assetid"],
-                asset["classid"],
-                asset["instanceid"],
-                desc.get("market_hash_name"),
-                desc.get("tradable"),
-                desc.get("marketable"),
-                desc.get("type"),
-                cat_str,
-                val_str,
-                desc.get("icon_url"),
-                now,
-            )
-        )
 
+async def load_and_store_inventory(
+    steamid: str, appid: int, pool: asyncpg.Pool | None = None
+) -> bool:
+    """
+    Загружает инвентарь и сохраняет в таблицу user_inventory. Соединение
+    из пула берётся только на COPY очередной страницы и на применение —
+    пока страница качается, оно свободно.
+    """
     try:
-        conn = await asyncpg.connect(**DB_CONFIG)
-        await conn.execute(
+        count = await _store_inventory(steamid, appid, pool)
+    except InventoryFetchError as e:
+        logging.error(f"❌ {e}")
+        return False
+    except Exception as e:
+        logging.critical(f"🔥 Ошибка сохранения в БД: {e}")
+        return False
+
+    if not count:
+        return False
+    logging.info(f"✅ Сохранено {count} предметов в user_inventory для {steamid}/{appid}")
+    return True
+
+
+async def migrate(pool: asyncpg.Pool | None = None) -> None:
+    """
+    Схема и миграции инвентаря — один раз при старте приложения (lifespan),
+    до первого запроса. Воркеры uvicorn стартуют одновременно, поэтому
+    миграция идёт под advisory-lock: остальные ждут и видят готовую схему.
+    """
+    async with db.acquire(pool) as conn:
+        await conn.execute("SELECT pg_advisory_lock(hashtext('migrate:inventory'))")
+        try:
+            await _ensure_schema(conn)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(hashtext('migrate:inventory'))")
+    logging.info("🗄 Схема инвентаря готова")
+
+
+async def _ensure_schema(conn) -> None:
+    """
+    Создаёт user_inventory с первичным ключом и item_descriptions; старую
+    таблицу без ключа или с полями предмета в каждой строке доводит до схемы.
+    """
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS item_descriptions (
+            appid INTEGER NOT NULL,
+            classid TEXT NOT NULL,
+            instanceid TEXT NOT NULL,
+            market_hash_name TEXT,
+            tradable INTEGER,
+            marketable INTEGER,
+            type TEXT,
+            categories TEXT,
+            tags TEXT,
+            icon_url TEXT,
+            PRIMARY KEY (appid, classid, instanceid)
+        );
+
+        CREATE TABLE IF NOT EXISTS user_inventory (
+            steamid TEXT NOT NULL,
+            appid INTEGER NOT NULL,
+            assetid TEXT NOT NULL,
+            classid TEXT,
+            instanceid TEXT,
+            updated_at TIMESTAMP,
+            PRIMARY KEY (steamid, appid, assetid)
+        );
+
+        -- страницы загрузок до применения; общая для соединений, поэтому
+        -- каждая загрузка пишет под своим load_id. WAL не нужен: после
+        -- падения сервера незавершённые загрузки всё равно повторяются
+        CREATE UNLOGGED TABLE IF NOT EXISTS user_inventory_stage (
+            load_id TEXT NOT NULL,
+            steamid TEXT NOT NULL,
+            appid INTEGER NOT NULL,
+            assetid TEXT NOT NULL,
+            classid TEXT,
+            instanceid TEXT,
+            updated_at TIMESTAMP,
+            staged_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS user_inventory_stage_idx
+            ON user_inventory_stage (load_id, assetid);
+        -- остатки загрузок упавших процессов; идущие сейчас моложе часа
+        DELETE FROM user_inventory_stage WHERE staged_at < now() - interval '1 hour';
+
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conrelid = 'user_inventory'::regclass AND contype = 'p'
+            ) THEN
+                DELETE FROM user_inventory
+                WHERE steamid IS NULL OR appid IS NULL OR assetid IS NULL;
+                DELETE FROM user_inventory a
+                USING user_inventory b
+                WHERE a.ctid < b.ctid
+                  AND a.steamid = b.steamid
+                  AND a.appid = b.appid
+                  AND a.assetid = b.assetid;
+                ALTER TABLE user_inventory ADD PRIMARY KEY (steamid, appid, assetid);
+            END IF;
+        END $$;
+
+    """
+    )
+    await _migrate_item_columns(conn)
+
+    summary_exists = await conn.fetchval(
+        "SELECT to_regclass('user_inventory_summary') IS NOT NULL"
+    )
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_inventory_summary (
+            steamid TEXT NOT NULL,
+            appid INTEGER NOT NULL,
+            market_hash_name TEXT,
+            tradable INTEGER,
+            marketable INTEGER,
+            icon_url TEXT,
+            updated_at TIMESTAMP,
+            count INTEGER NOT NULL,
+            price_usd NUMERIC NOT NULL DEFAULT 0,
+            total_usd NUMERIC GENERATED ALWAYS AS (price_usd * count) STORED,
+            id BIGINT GENERATED ALWAYS AS IDENTITY
+        );
+        -- id — второй ключ keyset-пагинации /getjsoninv
+        ALTER TABLE user_inventory_summary
+            ADD COLUMN IF NOT EXISTS id BIGINT GENERATED ALWAYS AS IDENTITY;
+        CREATE INDEX IF NOT EXISTS user_inventory_summary_idx
+            ON user_inventory_summary (steamid, appid);
+        -- сортировки страниц /getjsoninv: (ключ, id) в пределах пользователя
+        CREATE INDEX IF NOT EXISTS user_inventory_summary_price_idx
+            ON user_inventory_summary (steamid, price_usd, id);
+        CREATE INDEX IF NOT EXISTS user_inventory_summary_count_idx
+            ON user_inventory_summary (steamid, count, id);
+        CREATE INDEX IF NOT EXISTS user_inventory_summary_total_idx
+            ON user_inventory_summary (steamid, total_usd, id);
+    """
+    )
+    # поиск по подстроке имени; без pg_trgm (нет прав на расширение) —
+    # тот же ILIKE, но перебором строк пользователя
+    try:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                CREATE INDEX IF NOT EXISTS user_inventory_summary_name_trgm_idx
+                    ON user_inventory_summary USING gin (market_hash_name gin_trgm_ops);
             """
-            CREATE TABLE IF NOT EXISTS user_inventory (
-                steamid TEXT,
-                appid INTEGER,
-                assetid TEXT,
-                classid TEXT,
-                instanceid TEXT,
-                market_hash_name TEXT,
-                tradable INTEGER,
-                marketable INTEGER,
-                type TEXT,
-                categories TEXT,
-                tags TEXT,
-                icon_url TEXT,
-                updated_at TIMESTAMP
-            );
+            )
+    except asyncpg.PostgresError as e:
+        logging.warning(f"⚠️ Индекс pg_trgm по market_hash_name не создан: {e}")
+    # история стоимости и индекс держателей — общие с синхронизацией цен
+    await conn.execute(portfolio.SCHEMA_SQL)
+    if not summary_exists:
+        # первая миграция: сводка по всем уже загруженным инвентарям
+        async with conn.transaction():
+            await conn.execute(await _summary_insert_sql(conn, "TRUE"))
+        logging.info("🧮 Сводка user_inventory_summary построена")
+
+
+async def _migrate_item_columns(conn) -> None:
+    """
+    Разовая разрушающая миграция: поля предмета из строк user_inventory
+    переезжают в item_descriptions, колонки удаляются (место вернёт
+    ближайший VACUUM FULL / pg_repack). Одна транзакция — при ошибке
+    таблица остаётся в старом виде, старт приложения прерывается.
+    """
+    legacy = await conn.fetchval(
         """
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'user_inventory'
+              AND column_name = 'market_hash_name'
         )
+    """
+    )
+    if not legacy:
+        return
+
+    logging.warning("🗄 Миграция: поля предмета user_inventory → item_descriptions, колонки удаляются")
+    async with conn.transaction():
         await conn.execute(
-            "DELETE FROM user_inventory WHERE steamid = $1 AND appid = $2",
-            steamid,
-            appid,
-        )
-        await conn.executemany(
             """
-            INSERT INTO user_inventory (
-                steamid, appid, assetid, classid, instanceid,
-                market_hash_name, tradable, marketable, type,
-                categories, tags, icon_url, updated_at
-            ) VALUES (
-                $1, $2, $3, $4, $5,
-                $6, $7, $8, $9, $10,
-                $11, $12, $13
+            INSERT INTO item_descriptions (
+                appid, classid, instanceid, market_hash_name, tradable,
+                marketable, type, categories, tags, icon_url
             )
-        """,
-            rows,
+            SELECT DISTINCT ON (appid, classid, instanceid)
+                appid, classid, instanceid, market_hash_name, tradable,
+                marketable, type, categories, tags, icon_url
+            FROM user_inventory
+            WHERE classid IS NOT NULL AND instanceid IS NOT NULL
+            ORDER BY appid, classid, instanceid, updated_at DESC
+            ON CONFLICT DO NOTHING;
+
+            ALTER TABLE user_inventory
+                DROP COLUMN market_hash_name,
+                DROP COLUMN tradable,
+                DROP COLUMN marketable,
+                DROP COLUMN type,
+                DROP COLUMN categories,
+                DROP COLUMN tags,
+                DROP COLUMN icon_url;
+        """
         )
-        await conn.close()
-        logging.info(
-            f"✅ Сохранено {len(rows)} предметов в user_inventory для {steamid}/{appid}"
+    logging.info("🗄 Миграция полей предмета завершена")
+
+
+async def _summary_insert_sql(conn, where: str) -> str:
+    """
+    INSERT в user_inventory_summary: группировка user_inventory по полям
+    из item_descriptions и цена из
+    steamapis_items по цепочке prise_24h → prise_7d → avg (0 и NULL
+    пропускаются). Пока таблицы цен нет, цена 0.
+    """
+    has_prices = await conn.fetchval("SELECT to_regclass('steamapis_items') IS NOT NULL")
+    price, join = "0", ""
+    if has_prices:
+        price = PRICE_EXPR
+        join = """
+        LEFT JOIN steamapis_items p
+            ON p.appid = g.appid AND p.market_hash_name = g.market_hash_name"""
+
+    return f"""
+        INSERT INTO user_inventory_summary (
+            steamid, appid, market_hash_name, tradable, marketable,
+            icon_url, updated_at, count, price_usd
+        )
+        SELECT g.*, {price}
+        FROM (
+            SELECT
+                u.steamid, u.appid, d.market_hash_name, d.tradable, d.marketable,
+                MIN(d.icon_url), MAX(u.updated_at), COUNT(*)
+            FROM user_inventory u
+            JOIN item_descriptions d
+                ON d.appid = u.appid AND d.classid = u.classid AND d.instanceid = u.instanceid
+            WHERE {where}
+            GROUP BY u.steamid, u.appid, d.market_hash_name, d.tradable, d.marketable
+        ) g{join}
+    """
+
+
+async def _refresh_summary(conn, steamid: str, appid: int) -> None:
+    """Пересчитывает сводку одного (steamid, appid); вызывается внутри транзакции записи."""
+    await conn.execute(
+        "DELETE FROM user_inventory_summary WHERE steamid = $1 AND appid = $2",
+        steamid,
+        appid,
+    )
+    await conn.execute(
+        await _summary_insert_sql(conn, "u.steamid = $1 AND u.appid = $2"),
+        steamid,
+        appid,
+    )
+
+
+async def _store_inventory(steamid: str, appid: int, pool: asyncpg.Pool | None) -> int:
+    """
+    Конвейер: пока страница N пишется COPY в user_inventory_stage под своим
+    load_id, страница N+1 уже качается; соединение берётся на каждый COPY
+    и между страницами свободно. После последней страницы — разностное
+    применение одной транзакцией: новые предметы вставляются, пропавшие
+    удаляются, у остальных обновляются поля и updated_at, пересчитывается
+    сводка. До неё user_inventory не меняется — читатели не видят
+    пустой, частичный или рассогласованный инвентарь; staging неудачной
+    загрузки удаляется. В памяти на время выгрузки: разобранные описания
+    (по одному на класс предмета), ассеты, чьё описание ещё не пришло, и
+    одна-две страницы в prefetch — не список всех ассетов. Возвращает
+    число записанных предметов (0 — инвентарь пуст, ничего не менялось).
+    """
+    descriptions: dict[tuple[str, str], Description] = {}
+    new: dict[tuple[int, str, str], Description] = {}
+    pending: list[dict] = []
+    load_id = uuid.uuid4().hex
+    staged = 0
+    applied = False
+    db_time = 0.0
+    # строки в staging получают время начала; итоговый updated_at — после выгрузки
+    started_at = datetime.utcnow() + MSK_OFFSET
+
+    async def copy(rows):
+        nonlocal staged, db_time
+        if rows:
+            t0 = time.perf_counter()
+            async with db.acquire(pool) as conn:
+                await conn.copy_records_to_table(
+                    "user_inventory_stage", records=rows, columns=STAGE_COLUMNS
+                )
+            db_time += time.perf_counter() - t0
+            staged += len(rows)
+
+    try:
+        async for page in _prefetch(fetch_inventory_pages(steamid, appid)):
+            await copy(
+                _page_rows(steamid, appid, page, descriptions, new, pending, load_id, started_at)
+            )
+
+        # ассеты, чьё описание пришло на более поздней странице
+        await copy(
+            _page_rows(steamid, appid, {"assets": pending}, descriptions, new, [], load_id, started_at)
         )
+
+        if not staged:
+            logging.warning("⚠️ Нет предметов для вставки")
+            return 0
+
+        # московское время фиксируем после полной выгрузки
+        t0 = time.perf_counter()
+        async with db.acquire(pool) as conn:
+            async with conn.transaction():
+                await _store_descriptions(conn, new)
+                count = await _apply_stage(
+                    conn, steamid, appid, load_id, datetime.utcnow() + MSK_OFFSET
+                )
+        applied = True
+        db_time += time.perf_counter() - t0
+
+    finally:
+        if staged and not applied:
+            await _drop_stage(load_id, pool)
+
+    _remember(new)
+    metrics.INVENTORY_ITEMS.observe(count, appid=appid)
+    metrics.INVENTORY_DB_WRITE_SECONDS.observe(db_time)
+    return count
+
+
+async def _open_stage(conn, stage: str, like: str) -> None:
+    """Пустая временная таблица до конца транзакции."""
+    await conn.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {stage}
+            (LIKE {like} INCLUDING DEFAULTS)
+            ON COMMIT DROP;
+        TRUNCATE {stage};
+    """
+    )
+
+
+async def _apply_stage(conn, steamid: str, appid: int, load_id: str, now: datetime) -> int:
+    """
+    Разностное применение загрузки load_id и удаление её staging; дубли
+    assetid (перекрытие страниц) сводятся к одной строке. Возвращает
+    число предметов в инвентаре.
+    """
+    await conn.execute(
+        """
+        DELETE FROM user_inventory u
+        WHERE u.steamid = $1 AND u.appid = $2
+          AND NOT EXISTS (
+              SELECT 1 FROM user_inventory_stage s
+              WHERE s.load_id = $3 AND s.assetid = u.assetid
+          )
+    """,
+        steamid,
+        appid,
+        load_id,
+    )
+    columns = ", ".join(INVENTORY_COLUMNS[:-1])
+    status = await conn.execute(
+        f"""
+        INSERT INTO user_inventory ({columns}, updated_at)
+        SELECT DISTINCT ON (assetid) {columns}, $2::timestamp
+        FROM user_inventory_stage
+        WHERE load_id = $1
+        ORDER BY assetid
+        ON CONFLICT (steamid, appid, assetid) DO UPDATE SET
+            classid    = EXCLUDED.classid,
+            instanceid = EXCLUDED.instanceid,
+            updated_at = EXCLUDED.updated_at
+    """,
+        load_id,
+        now,
+    )
+    await conn.execute("DELETE FROM user_inventory_stage WHERE load_id = $1", load_id)
+    await _refresh_summary(conn, steamid, appid)
+    await portfolio.record(conn, steamid, appid)
+    return int(status.split()[-1])
+
+
+async def _drop_stage(load_id: str, pool: asyncpg.Pool | None) -> None:
+    """Staging незавершённой загрузки; не удалось — подчистит migrate."""
+    try:
+        async with db.acquire(pool) as conn:
+            await conn.execute("DELETE FROM user_inventory_stage WHERE load_id = $1", load_id)
+    except Exception as e:
+        logging.error(f"❌ Staging загрузки {load_id} не удалён: {e}")
+
+
+async def _store_descriptions(conn, new: dict) -> None:
+    """Upsert новых и изменившихся описаний; неизменные строки не трогаются."""
+    if not new:
+        return
+
+    await _open_stage(conn, "item_descriptions_stage", "item_descriptions")
+    # порядок ключей одинаковый во всех воркерах — без взаимных блокировок
+    await conn.copy_records_to_table(
+        "item_descriptions_stage",
+        records=[new[key].as_record() for key in sorted(new)],
+        columns=DESCRIPTION_COLUMNS,
+    )
+    fields = DESCRIPTION_COLUMNS[3:]
+    await conn.execute(
+        f"""
+        INSERT INTO item_descriptions ({", ".join(DESCRIPTION_COLUMNS)})
+        SELECT {", ".join(DESCRIPTION_COLUMNS)} FROM item_descriptions_stage
+        ORDER BY appid, classid, instanceid
+        ON CONFLICT (appid, classid, instanceid) DO UPDATE SET
+            {", ".join(f"{c} = EXCLUDED.{c}" for c in fields)}
+        WHERE ({", ".join(f"item_descriptions.{c}" for c in fields)})
+            IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in fields)})
+    """
+    )
+
+
+# === Single-flight ===
+async def load_inventory_once(
+    steamid: str, appid: int, pool: asyncpg.Pool | None = None
+) -> bool:
+    """
+    load_and_store_inventory с дедупликацией: параллельные вызовы для
+    одного (steamid, appid) ждут одну и ту же загрузку, а в течение
+    FRESH_SECONDS после успешной загрузки новая не запускается.
+    """
+    key = (steamid, int(appid))
+
+    loaded_at = _loaded_at.get(key)
+    if loaded_at is not None and time.monotonic() - loaded_at < FRESH_SECONDS:
+        logging.info(f"♻️ Инвентарь {steamid}/{appid} свежий, загрузка пропущена")
         return True
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load_exclusive(steamid, int(appid), pool))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        logging.info(f"⏳ Присоединяемся к загрузке {steamid}/{appid}")
+
+    # shield: отмена одного ожидающего не отменяет общую загрузку
+    ok = await asyncio.shield(task)
+    if ok:
+        now = time.monotonic()
+        _loaded_at[key] = now
+        if len(_loaded_at) > 1024:
+            for k, ts in list(_loaded_at.items()):
+                if now - ts >= FRESH_SECONDS:
+                    del _loaded_at[k]
+    return ok
+
+
+async def _load_exclusive(steamid: str, appid: int, pool: asyncpg.Pool | None) -> bool:
+    if SINGLEFLIGHT_MODE != "lease":
+        return await load_and_store_inventory(steamid, appid, pool)
+
+    # между воркерами: аренда на ключ; занята — ждём с backoff, не держа
+    # соединение, и после каждой попытки проверяем свежесть по БД
+    lease_key = f"inventory:{steamid}:{appid}"
+    deadline = time.monotonic() + LEASE_WAIT
+    delay = 0.2
+    try:
+        while (token := await db.try_lease(lease_key, LEASE_SECONDS, pool)) is None:
+            if time.monotonic() >= deadline:
+                logging.error(f"❌ Инвентарь {steamid}/{appid}: аренда занята дольше {LEASE_WAIT} с")
+                return False
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, 5.0)
+            async with db.acquire(pool) as conn:
+                if await _is_fresh_in_db(conn, steamid, appid):
+                    logging.info(f"♻️ Инвентарь {steamid}/{appid} обновлён другим воркером")
+                    return True
+    except Exception as e:
+        logging.critical(f"🔥 Ошибка аренды загрузки: {e}")
+        return False
+
+    try:
+        async with db.acquire(pool) as conn:
+            fresh = await _is_fresh_in_db(conn, steamid, appid)
+        if fresh:
+            logging.info(f"♻️ Инвентарь {steamid}/{appid} обновлён другим воркером")
+            return True
+        return await load_and_store_inventory(steamid, appid, pool)
     except Exception as e:
         logging.critical(f"🔥 Ошибка сохранения в БД: {e}")
         return False
+    finally:
+        try:
+            await db.release_lease(lease_key, token, pool)
+        except Exception as e:
+            # аренда истечёт сама через LEASE_SECONDS
+            logging.error(f"❌ Аренда {lease_key} не снята: {e}")
+
+
+async def _is_fresh_in_db(conn, steamid: str, appid: int) -> bool:
+    last = await conn.fetchval(
+        "SELECT MAX(updated_at) FROM user_inventory WHERE steamid = $1 AND appid = $2",
+        steamid,
+        appid,
+    )
+    now = datetime.utcnow() + MSK_OFFSET
+    return last is not None and now - last < timedelta(seconds=FRESH_SECONDS)
+
+
+# === Пакетная загрузка ===
+async def load_inventories_batch(
+    pairs: list[tuple[str, int]], pool: asyncpg.Pool | None = None
+) -> list[dict]:
+    """
+    Загрузка нескольких (steamid, appid) через load_inventory_once: пары,
+    которые уже грузятся (очередь jobs, соседний запрос), не качаются второй
+    раз, свежие пропускаются. Одновременно не больше BATCH_CONCURRENCY
+    загрузок на процесс. Каждая пара пишется своей транзакцией по мере
+    выгрузки, а не все одной: общая транзакция не может разделить
+    загрузку, уже идущую в jobs или соседнем запросе, и требовала бы
+    держать весь пакет в памяти или соединение на всё время выгрузки.
+    Пакет поэтому не атомарен — статус каждой пары в ответе.
+    Статусы: ok, fresh, failed (ошибка загрузки или пустой инвентарь),
+    error (загрузка не завершилась).
+    """
+    results = {
+        key: {"steamid": key[0], "appid": key[1], "status": "error"}
+        for key in pairs
+    }
+
+    async def load(key):
+        loaded_at = _loaded_at.get(key)
+        if loaded_at is not None and time.monotonic() - loaded_at < FRESH_SECONDS:
+            results[key]["status"] = "fresh"
+            return
+        async with _batch_slots:
+            ok = await load_inventory_once(*key, pool)
+        results[key]["status"] = "ok" if ok else "failed"
+
+    outcomes = await asyncio.gather(*(load(key) for key in pairs), return_exceptions=True)
+    for key, outcome in zip(pairs, outcomes):
+        if isinstance(outcome, BaseException):
+            logging.error(f"❌ {key[0]}/{key[1]}: {outcome}")
+
+    ok = sum(r["status"] in ("ok", "fresh") for r in results.values())
+    logging.info(f"✅ Пакет: {ok} из {len(results)} инвентарей актуальны")
+    return list(results.values())
 
 
 # === Эндпоинт ===
 @router.get("/inventory/{steamid}/{appid}")
-async def inventory_endpoint(steamid: str, appid: int, request: Request):
+async def inventory_endpoint(
+    steamid: str,
+    appid: int,
+    request: Request,
+    pool: asyncpg.Pool = Depends(db.get_pool),
+):
     if "steamid" not in request.session:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    success = await load_and_store_inventory(steamid, appid)
+    success = await load_inventory_once(steamid, appid, pool)
     if success:
         return JSONResponse(content={"message": "Inventory saved to database"})
     else:
         return JSONResponse(
             status_code=500, content={"error": "Failed to process inventory"}
         )
+
+
+@router.post("/inventory/batch")
+async def inventory_batch_endpoint(
+    request: Request,
+    steamids: list[str] = Query(...),
+    appids: list[int] = Query(...),
+    pool: asyncpg.Pool = Depends(db.get_pool),
+):
+    """Все сочетания steamids × appids; ответ — статус по каждой паре."""
+    if "steamid" not in request.session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if not all(s.isdigit() for s in steamids):
+        raise HTTPException(400, "Invalid steamid")
+    if not all(a in SUPPORTED_APPS for a in appids):
+        raise HTTPException(400, "Unsupported appid")
+    pairs = list(dict.fromkeys((s, a) for s in steamids for a in appids))
+    if len(pairs) > BATCH_MAX_ITEMS:
+        raise HTTPException(400, f"Too many inventories (max {BATCH_MAX_ITEMS})")
+
+    return {"results": await load_inventories_batch(pairs, pool)}
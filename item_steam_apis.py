@@ -1,23 +1,23 @@
 import psycopg2
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import io
+import re
+import time
 import logging
 import os
-import configparser
+import sys
 
-# === КОНФИГ ===
-config = configparser.ConfigParser()
-config.read(os.path.join(os.path.dirname(__file__), 'config.ini'))
+import portfolio
+from portfolio import PRICE_EXPR
+from settings import DB_CONFIG as APP_DB_CONFIG, config
 
 
 # === ЛОГГЕР ===
-LOG_DIR = "/root/Site/logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, "steamapi_sync.log"),
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# в приложении (scheduler) пишем в общий лог, файл — только при запуске скриптом
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
 
 # === НАСТРОЙКИ ===
 API_KEY = config['steam']['api_key']
@@ -30,12 +30,27 @@ GAMES = {
     "tf2": 440
 }
 
+# порядок колонок для COPY — совпадает с ключами normalize_item
+ITEM_COLUMNS = (
+    "appid", "market_hash_name", "nameid", "latest", "min", "avg", "max",
+    "mean", "median", "prise_24h", "prise_7d", "prise_30d", "prise_90d",
+    "sold_24h", "sold_7d", "sold_30d", "sold_90d", "sold_avg",
+    "unstable", "unstable_reason", "updated_at",
+    "quality", "rarity", "hero", "image",
+)
+COPY_CHUNK = 1 << 16
+TEXT_NOT_NULL = "nameid, quality, rarity, hero, image"
+
+# инкрементальный режим; полная пересборка — не реже раза в N часов
+FULL_REBUILD_HOURS = config.getint("steamapis", "full_rebuild_hours", fallback=24)
+
+# те же параметры, что у пула приложения; psycopg2 ждёт dbname вместо database
 DB_CONFIG = {
-    "dbname": config['database']['dbname'],
-    "user": config['database']['user'],
-    "password": config['database']['password'],
-    "host": config['database']['host'],
-    "port": config.getint('database', 'port')
+    "dbname": APP_DB_CONFIG["database"],
+    "user": APP_DB_CONFIG["user"],
+    "password": APP_DB_CONFIG["password"],
+    "host": APP_DB_CONFIG["host"],
+    "port": APP_DB_CONFIG["port"],
 }
 
 def format_unix(timestamp):
@@ -74,10 +89,340 @@ def normalize_item(appid, item):
         "image": item.get("image", "")
     }
 
+class _CsvStream:
+    """
+    Файлоподобный поток для COPY ... FROM STDIN: строки CSV
+    формируются лениво из нормализованных предметов (генератор или
+    список — итератор один на весь поток, иначе список читается заново
+    при каждом read() и COPY не заканчивается).
+    """
+
+    def __init__(self, items):
+        self._items = iter(items)
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf)
+        self._chunk = ""
+        self.count = 0
+
+    def _fill(self, size):
+        self._buf.seek(0)
+        self._buf.truncate()
+        for norm in self._items:
+            self._writer.writerow(_csv_value(norm[col]) for col in ITEM_COLUMNS)
+            self.count += 1
+            if self._buf.tell() >= size:
+                break
+        return self._buf.getvalue()
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else COPY_CHUNK
+        while len(self._chunk) < size:
+            more = self._fill(size)
+            if not more:
+                break
+            self._chunk += more
+        out, self._chunk = self._chunk[:size], self._chunk[size:]
+        return out
+
+
+def _csv_value(value):
+    # None → пустое поле без кавычек (NULL), bool → литерал PostgreSQL;
+    # пустые строки в текстовых полях сохраняет FORCE_NOT_NULL в COPY
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def _iter_normalized(loaded):
+    """Нормализованные предметы всех игр; дубли имени внутри игры схлопываются (последний побеждает)."""
+    for game, items in loaded.items():
+        appid = GAMES[game]
+        unique = {item.get("market_hash_name"): item for item in items}
+        for item in unique.values():
+            yield normalize_item(appid, item)
+
+
+def _copy_items(cur, table, norms):
+    """COPY нормализованных предметов в таблицу; возвращает число строк."""
+    stream = _CsvStream(norms)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(ITEM_COLUMNS)}) FROM STDIN "
+        f"WITH (FORMAT csv, FORCE_NOT_NULL ({TEXT_NOT_NULL}))",
+        stream,
+        size=COPY_CHUNK,
+    )
+    return stream.count
+
+
+def _ensure_version_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS steamapis_version (
+            id INT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            swapped_at TIMESTAMP NOT NULL
+        )
+    """)
+    cur.execute("ALTER TABLE steamapis_version ADD COLUMN IF NOT EXISTS rebuilt_at TIMESTAMP")
+
+
+def _bump_version(cur, full):
+    # версия растёт в той же транзакции — кэши цен в API увидят изменения
+    cur.execute("""
+        INSERT INTO steamapis_version (id, version, swapped_at, rebuilt_at)
+        VALUES (1, 1, NOW(), CASE WHEN %(full)s THEN NOW() END)
+        ON CONFLICT (id) DO UPDATE SET
+            version = steamapis_version.version + 1,
+            swapped_at = EXCLUDED.swapped_at,
+            rebuilt_at = COALESCE(EXCLUDED.rebuilt_at, steamapis_version.rebuilt_at)
+    """, {"full": full})
+
+
+def _reprice_summary(cur, delta_table=None):
+    """
+    Переоценивает user_inventory_summary: целиком по steamapis_items
+    или только позиции из delta_table. Меняются лишь строки с новой ценой;
+    их владельцы попадают в portfolio_touched для переоценки портфелей.
+    """
+    cur.execute("SELECT to_regclass('user_inventory_summary') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+
+    portfolio.open_touched(cur)
+    if delta_table is None:
+        update = f"""
+            UPDATE user_inventory_summary s
+            SET price_usd = n.price_usd
+            FROM (
+                SELECT s2.ctid AS row_id, {PRICE_EXPR} AS price_usd
+                FROM user_inventory_summary s2
+                LEFT JOIN steamapis_items p
+                    ON p.appid = s2.appid AND p.market_hash_name = s2.market_hash_name
+            ) n
+            WHERE s.ctid = n.row_id AND s.price_usd IS DISTINCT FROM n.price_usd
+        """
+    else:
+        # держатели позиций дельты — по индексу (appid, market_hash_name)
+        update = f"""
+            UPDATE user_inventory_summary s
+            SET price_usd = {PRICE_EXPR}
+            FROM {delta_table} p
+            WHERE p.appid = s.appid AND p.market_hash_name = s.market_hash_name
+              AND s.price_usd IS DISTINCT FROM {PRICE_EXPR}
+        """
+    cur.execute(f"""
+        WITH repriced AS ({update} RETURNING s.steamid, s.appid),
+        touched AS (
+            INSERT INTO {portfolio.TOUCHED_TABLE}
+            SELECT DISTINCT steamid, appid FROM repriced
+        )
+        SELECT COUNT(*) FROM repriced
+    """)
+    return cur.fetchone()[0]
+
+
+# === ИСТОРИЯ ЦЕН ===
+# изменения цен — в price_history (партиции по неделям); старше HISTORY_RAW_WEEKS
+# сворачиваются в дневные OHLC в price_history_daily, сырые партиции удаляются
+HISTORY_RAW_WEEKS = config.getint("pricehistory", "raw_weeks", fallback=4)
+WEEK_PARTITION_RE = re.compile(r"_w(\d{8})$")
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _ensure_history_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS price_history (
+            appid INT NOT NULL,
+            market_hash_name TEXT NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            price NUMERIC NOT NULL
+        ) PARTITION BY RANGE (ts);
+        CREATE INDEX IF NOT EXISTS price_history_key_idx
+            ON price_history (appid, market_hash_name, ts);
+
+        CREATE TABLE IF NOT EXISTS price_history_last (
+            appid INT NOT NULL,
+            market_hash_name TEXT NOT NULL,
+            price NUMERIC NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            PRIMARY KEY (appid, market_hash_name)
+        );
+
+        CREATE TABLE IF NOT EXISTS price_history_daily (
+            appid INT NOT NULL,
+            market_hash_name TEXT NOT NULL,
+            day DATE NOT NULL,
+            open NUMERIC NOT NULL,
+            high NUMERIC NOT NULL,
+            low NUMERIC NOT NULL,
+            close NUMERIC NOT NULL,
+            samples INT NOT NULL,
+            PRIMARY KEY (appid, market_hash_name, day)
+        );
+
+        -- страховка: строка вне недельных партиций не роняет синхронизацию
+        CREATE TABLE IF NOT EXISTS price_history_default
+            PARTITION OF price_history DEFAULT;
+    """)
+    # текущая и следующая неделя по часам БД — ts пишет NOW(), так что
+    # расхождение часов приложения и БД не уводит строки в DEFAULT
+    cur.execute("SELECT (NOW() AT TIME ZONE 'UTC')::date")
+    this_week = _week_start(cur.fetchone()[0])
+    for start in (this_week, this_week + timedelta(weeks=1)):
+        _create_week_partition(cur, start)
+
+
+def _create_week_partition(cur, start):
+    name = f"price_history_w{start:%Y%m%d}"
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    if cur.fetchone()[0]:
+        return
+    end = start + timedelta(weeks=1)
+    # строки этой недели из DEFAULT переезжают в новую партицию — иначе
+    # PARTITION OF не пройдёт проверку DEFAULT
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS price_history_moved (LIKE price_history) ON COMMIT DROP;
+        TRUNCATE price_history_moved;
+        WITH moved AS (
+            DELETE FROM price_history_default
+            WHERE ts >= '{start}' AND ts < '{end}'
+            RETURNING *
+        )
+        INSERT INTO price_history_moved SELECT * FROM moved;
+
+        CREATE TABLE IF NOT EXISTS {name}
+            PARTITION OF price_history
+            FOR VALUES FROM ('{start}') TO ('{end}');
+        INSERT INTO price_history SELECT * FROM price_history_moved;
+    """)
+
+
+def _record_history(cur, source):
+    """
+    Пишет в price_history только цены, изменившиеся с прошлой записи
+    (сравнение с price_history_last); source — steamapis_items или дельта.
+    """
+    _ensure_history_tables(cur)
+    cur.execute(f"""
+        WITH cur AS (
+            SELECT p.appid, p.market_hash_name, {PRICE_EXPR} AS price
+            FROM {source} p
+            WHERE p.market_hash_name IS NOT NULL
+        ),
+        changed AS (
+            INSERT INTO price_history_last AS l (appid, market_hash_name, price, ts)
+            SELECT appid, market_hash_name, price, NOW() AT TIME ZONE 'UTC'
+            FROM cur
+            WHERE price > 0
+            ON CONFLICT (appid, market_hash_name) DO UPDATE SET
+                price = EXCLUDED.price,
+                ts = EXCLUDED.ts
+            WHERE l.price IS DISTINCT FROM EXCLUDED.price
+            RETURNING appid, market_hash_name, price, ts
+        )
+        INSERT INTO price_history (appid, market_hash_name, ts, price)
+        SELECT appid, market_hash_name, ts, price FROM changed
+    """)
+    return cur.rowcount
+
+
+def _compact_history(cur):
+    """
+    Недели старше HISTORY_RAW_WEEKS: дневные OHLC в price_history_daily,
+    затем партиция целиком удаляется; старые строки DEFAULT сворачиваются
+    так же и удаляются построчно. Возвращает число удалённых партиций.
+    """
+    _ensure_history_tables(cur)
+    cutoff = _week_start(datetime.utcnow().date()) - timedelta(weeks=HISTORY_RAW_WEEKS)
+
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'price_history'::regclass
+    """)
+    dropped = 0
+    for (name,) in cur.fetchall():
+        m = WEEK_PARTITION_RE.search(name)
+        if m is None:
+            continue                               # DEFAULT
+        start = datetime.strptime(m.group(1), "%Y%m%d").date()
+        if start + timedelta(weeks=1) > cutoff:
+            continue
+        _fold_daily(cur, name, "TRUE")
+        cur.execute(f"DROP TABLE {name}")
+        dropped += 1
+
+    where = f"ts < '{cutoff}'"
+    _fold_daily(cur, "price_history_default", where)
+    cur.execute(f"DELETE FROM price_history_default WHERE {where}")
+    return dropped
+
+
+def _fold_daily(cur, table, where):
+    cur.execute(f"""
+        INSERT INTO price_history_daily
+            (appid, market_hash_name, day, open, high, low, close, samples)
+        SELECT
+            appid, market_hash_name, ts::date,
+            (array_agg(price ORDER BY ts))[1],
+            MAX(price), MIN(price),
+            (array_agg(price ORDER BY ts DESC))[1],
+            COUNT(*)
+        FROM {table}
+        WHERE {where}
+        GROUP BY appid, market_hash_name, ts::date
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def _log_timings(timings):
+    logging.info(
+        "⏱ Этапы: " + ", ".join(f"{stage}={sec:.2f}s" for stage, sec in timings.items())
+    )
+
+
+def fetch_game(game, appid):
+    """Скачивает и разбирает рынок одной игры; возвращает (items, fetch_s, parse_s)."""
+    started = time.perf_counter()
+    res = requests.get(BASE_URL.format(appid=appid), timeout=30)
+    res.raise_for_status()
+    fetched = time.perf_counter()
+    items = res.json().get("data", [])
+    return items, fetched - started, time.perf_counter() - fetched
+
+
+def fetch_all_games():
+    """Параллельная загрузка всех игр из GAMES; упавшие игры пропускаются."""
+    loaded, fetch_s, parse_s = {}, 0.0, 0.0
+    with ThreadPoolExecutor(max_workers=len(GAMES)) as pool:
+        futures = {pool.submit(fetch_game, game, appid): game for game, appid in GAMES.items()}
+        for fut in as_completed(futures):
+            game = futures[fut]
+            try:
+                items, f_s, p_s = fut.result()
+            except Exception as e:
+                logging.error(f"❌ Ошибка загрузки {game.upper()}: {e}")
+                continue
+            loaded[game] = items
+            fetch_s = max(fetch_s, f_s)
+            parse_s = max(parse_s, p_s)
+            logging.info(f"{game.upper()}: загружено {len(items)} предметов")
+    return loaded, fetch_s, parse_s
+
+
 def atomic_refresh_data():
     logging.info("🚀 Начало обновления steamapis_items")
+    timings = {}
 
     try:
+        # загрузка идёт параллельно и до открытия соединения с БД
+        started = time.perf_counter()
+        loaded, timings["fetch"], timings["parse"] = fetch_all_games()
+        logging.info(f"🌐 Загрузка игр заняла {time.perf_counter() - started:.2f} с")
+
         conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
 
@@ -120,30 +465,21 @@ def atomic_refresh_data():
         """)
         logging.info("✅ Временная таблица steamapis_items_tmp создана.")
 
-        total_count = 0
+        # COPY одним потоком по всем играм, без индексов на таблице
+        started = time.perf_counter()
+        total_count = _copy_items(cur, "steamapis_items_tmp", _iter_normalized(loaded))
+        timings["copy"] = time.perf_counter() - started
+        del loaded
 
-        for game, appid in GAMES.items():
-            url = BASE_URL.format(appid=appid)
-            try:
-                res = requests.get(url, timeout=30)
-                res.raise_for_status()
-                items = res.json().get("data", [])
-                for item in items:
-                    norm = normalize_item(appid, item)
-                    cur.execute("""
-                        INSERT INTO steamapis_items_tmp VALUES (
-                            %(appid)s, %(market_hash_name)s, %(nameid)s, %(latest)s, %(min)s,
-                            %(avg)s, %(max)s, %(mean)s, %(median)s,
-                            %(prise_24h)s, %(prise_7d)s, %(prise_30d)s, %(prise_90d)s,
-                            %(sold_24h)s, %(sold_7d)s, %(sold_30d)s, %(sold_90d)s, %(sold_avg)s,
-                            %(unstable)s, %(unstable_reason)s, %(updated_at)s,
-                            %(quality)s, %(rarity)s, %(hero)s, %(image)s
-                        )
-                    """, norm)
-                logging.info(f"{game.upper()}: загружено {len(items)} предметов")
-                total_count += len(items)
-            except Exception as e:
-                logging.error(f"❌ Ошибка загрузки {game.upper()}: {e}")
+        # индекс строим после загрузки — так быстрее, чем поддерживать его на каждой вставке;
+        # уникальность нужна для ON CONFLICT в инкрементальном режиме
+        started = time.perf_counter()
+        cur.execute("""
+            CREATE UNIQUE INDEX steamapis_items_tmp_key_idx
+                ON steamapis_items_tmp (appid, market_hash_name)
+        """)
+        cur.execute("ANALYZE steamapis_items_tmp")
+        timings["index"] = time.perf_counter() - started
 
         cur.execute("""
             SELECT EXISTS (
@@ -153,26 +489,173 @@ def atomic_refresh_data():
         """)
         exists = cur.fetchone()[0]
 
+        _ensure_version_table(cur)
+
+        started = time.perf_counter()
         cur.execute("BEGIN")
 
         if exists:
             cur.execute("DROP TABLE IF EXISTS steamapis_items_old")
             logging.info("♻️ Удалена старая steamapis_items_old (если была)")
             cur.execute("ALTER TABLE steamapis_items RENAME TO steamapis_items_old")
+            cur.execute("ALTER INDEX IF EXISTS steamapis_items_key_idx RENAME TO steamapis_items_old_key_idx")
             logging.info("📤 Переименована steamapis_items → steamapis_items_old")
 
         cur.execute("ALTER TABLE steamapis_items_tmp RENAME TO steamapis_items")
+        cur.execute("ALTER INDEX steamapis_items_tmp_key_idx RENAME TO steamapis_items_key_idx")
         logging.info("✅ Переименована steamapis_items_tmp → steamapis_items")
 
         conn.commit()
+        timings["swap"] = time.perf_counter() - started
+
+        # сводки инвентарей переоцениваем отдельной транзакцией и только
+        # вместе с ней поднимаем версию — кэши не увидят новую версию со старыми суммами
+        started = time.perf_counter()
+        repriced = _reprice_summary(cur)
+        revalued = portfolio.revalue_touched(cur) if repriced else 0
+        history = _record_history(cur, "steamapis_items")
+        _bump_version(cur, full=True)
+        conn.commit()
+        timings["reprice"] = time.perf_counter() - started
+        logging.info(f"🧮 Переоценено позиций в сводках: {repriced}")
+        logging.info(f"💼 Новых точек стоимости портфелей: {revalued}")
+        logging.info(f"📈 В историю цен записано изменений: {history}")
+
+        # сжатие истории — раз в полную пересборку, отдельной транзакцией
+        started = time.perf_counter()
+        dropped = _compact_history(cur)
+        conn.commit()
+        timings["history"] = time.perf_counter() - started
+        if dropped:
+            logging.info(f"🗜 История цен: свёрнуто в дневные OHLC недель: {dropped}")
         logging.info("🧾 Коммит выполнен. Данные зафиксированы.")
         logging.info(f"🎉 Обновление завершено. Всего загружено: {total_count} предметов.")
+        _log_timings(timings)
 
         cur.close()
         conn.close()
+        return True
 
     except Exception as e:
         logging.critical(f"🔥 Глобальная ошибка обновления: {e}")
+        return False
+
+
+def _needs_full_rebuild(cur):
+    """Полная пересборка нужна без уникального ключа или если последняя была давно."""
+    cur.execute("""
+        SELECT i.indisunique
+        FROM pg_index i
+        WHERE i.indexrelid = to_regclass('steamapis_items_key_idx')
+    """)
+    row = cur.fetchone()
+    if not row or not row[0]:
+        return True
+
+    _ensure_version_table(cur)
+    cur.execute("""
+        SELECT rebuilt_at IS NULL
+            OR rebuilt_at < NOW() - make_interval(hours => %s)
+        FROM steamapis_version WHERE id = 1
+    """, (FULL_REBUILD_HOURS,))
+    row = cur.fetchone()
+    cur.connection.commit()         # не держим блокировку steamapis_version во время загрузки
+    return not row or row[0]
+
+
+def incremental_refresh_data():
+    """
+    Обновляет в steamapis_items только предметы, у которых сменился
+    updated_at. Исчезнувшие с рынка позиции уходят при периодической
+    полной пересборке (atomic_refresh_data). Возвращает True при успехе.
+    """
+    logging.info("🚀 Начало инкрементального обновления steamapis_items")
+    timings = {}
+
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        cur = conn.cursor()
+
+        if _needs_full_rebuild(cur):
+            cur.close()
+            conn.close()
+            logging.info("🔁 Требуется полная пересборка")
+            return atomic_refresh_data()
+
+        started = time.perf_counter()
+        loaded, timings["fetch"], timings["parse"] = fetch_all_games()
+        logging.info(f"🌐 Загрузка игр заняла {time.perf_counter() - started:.2f} с")
+
+        started = time.perf_counter()
+        cur.execute("SELECT appid, market_hash_name, updated_at FROM steamapis_items")
+        stored = {
+            (appid, name): ts.strftime("%Y-%m-%d %H:%M:%S") if ts else None
+            for appid, name, ts in cur.fetchall()
+        }
+        changed = [
+            norm for norm in _iter_normalized(loaded)
+            if stored.get((norm["appid"], norm["market_hash_name"])) != norm["updated_at"]
+        ]
+        del loaded, stored
+        timings["diff"] = time.perf_counter() - started
+
+        if not changed:
+            conn.commit()
+            logging.info("😴 Изменений цен нет")
+            _log_timings(timings)
+            cur.close()
+            conn.close()
+            return True
+
+        started = time.perf_counter()
+        cur.execute("""
+            CREATE TEMP TABLE steamapis_items_delta
+                (LIKE steamapis_items INCLUDING DEFAULTS)
+                ON COMMIT DROP
+        """)
+        _copy_items(cur, "steamapis_items_delta", changed)
+        timings["copy"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        updates = ",\n".join(
+            f"{col} = EXCLUDED.{col}" for col in ITEM_COLUMNS[2:]
+        )
+        cur.execute(f"""
+            INSERT INTO steamapis_items ({', '.join(ITEM_COLUMNS)})
+            SELECT {', '.join(ITEM_COLUMNS)} FROM steamapis_items_delta
+            ON CONFLICT (appid, market_hash_name) DO UPDATE SET
+            {updates}
+        """)
+        repriced = _reprice_summary(cur, "steamapis_items_delta")
+        revalued = portfolio.revalue_touched(cur) if repriced else 0
+        history = _record_history(cur, "steamapis_items_delta")
+        _bump_version(cur, full=False)
+        conn.commit()
+        timings["upsert"] = time.perf_counter() - started
+        logging.info(f"🧮 Переоценено позиций в сводках: {repriced}")
+        logging.info(f"💼 Новых точек стоимости портфелей: {revalued}")
+        logging.info(f"📈 В историю цен записано изменений: {history}")
+
+        logging.info(f"🎉 Инкрементальное обновление: изменено {len(changed)} предметов.")
+        _log_timings(timings)
+
+        cur.close()
+        conn.close()
+        return True
+
+    except Exception as e:
+        logging.critical(f"🔥 Глобальная ошибка инкрементального обновления: {e}")
+        return False
+
 
 if __name__ == "__main__":
-    atomic_refresh_data()
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=os.path.join(LOG_DIR, "steamapi_sync.log"),
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    if "--full" in sys.argv:
+        atomic_refresh_data()
+    else:
+        incremental_refresh_data()
@@ -0,0 +1,147 @@
+# jobs.py
+"""
+Внутрипроцессная очередь загрузок инвентаря.
+
+Задачи кладутся в ограниченную asyncio.Queue и разбираются пулом
+воркеров, которые вызывают inventory.load_inventory_once напрямую —
+без HTTP-вызова самого себя. Переполненная очередь отклоняет новые
+задачи (QueueFull), так число одновременных обращений к steamapis
+ограничено числом воркеров.
+"""
+import time
+import uuid
+import asyncio
+import logging
+from dataclasses import dataclass, field, asdict
+
+from fastapi import APIRouter, HTTPException, Request
+
+import inventory
+from settings import config
+
+router = APIRouter()
+
+# === НАСТРОЙКИ ===
+JOB_WORKERS = config.getint("jobs", "workers", fallback=4)
+JOB_QUEUE_SIZE = config.getint("jobs", "queue_size", fallback=100)
+JOB_TTL = config.getint("jobs", "ttl_seconds", fallback=600)   # сколько помним завершённые
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    steamid: str
+    appid: int
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_jobs: dict[str, Job] = {}
+_active: dict[tuple[str, int], Job] = {}       # (steamid, appid) → queued/running
+
+
+# === Жизненный цикл ===
+async def start() -> None:
+    global _queue
+    _queue = asyncio.Queue(maxsize=JOB_QUEUE_SIZE)
+    _workers[:] = [asyncio.create_task(_worker()) for _ in range(JOB_WORKERS)]
+    logging.info(f"🧵 Очередь загрузок: {JOB_WORKERS} воркеров, ёмкость {JOB_QUEUE_SIZE}")
+
+
+async def stop() -> None:
+    for w in _workers:
+        w.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+# === API модуля ===
+def submit(steamid: str, appid: int) -> Job:
+    """Ставит загрузку в очередь; активная задача на тот же ключ переиспользуется."""
+    if _queue is None:
+        raise RuntimeError("Job queue is not started")
+
+    _prune()
+    key = (steamid, appid)
+    if (job := _active.get(key)) is not None:
+        return job
+
+    job = Job(steamid=steamid, appid=appid)
+    try:
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        logging.warning(f"🚦 Очередь загрузок заполнена, отказ для {steamid}/{appid}")
+        raise QueueFull()
+
+    _jobs[job.id] = job
+    _active[key] = job
+    return job
+
+
+def get(job_id: str) -> Job | None:
+    return _jobs.get(job_id)
+
+
+def stats() -> dict:
+    return {
+        "workers": len(_workers),
+        "queued": _queue.qsize() if _queue else 0,
+        "capacity": JOB_QUEUE_SIZE,
+        "running": sum(1 for j in _active.values() if j.status == RUNNING),
+    }
+
+
+def _prune() -> None:
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at is not None and now - job.finished_at > JOB_TTL:
+            del _jobs[job_id]
+
+
+async def _worker() -> None:
+    while True:
+        job = await _queue.get()
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            ok = await inventory.load_inventory_once(job.steamid, job.appid)
+            job.status = DONE if ok else FAILED
+            if not ok:
+                job.error = "Failed to process inventory"
+        except Exception as e:
+            logging.error(f"❌ Задача {job.id} упала: {e}")
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            _active.pop((job.steamid, job.appid), None)
+            _queue.task_done()
+
+
+# === Эндпоинты ===
+@router.get("/jobs")
+async def jobs_stats(request: Request):
+    if "steamid" not in request.session:
+        raise HTTPException(401, "Unauthorized")
+    return stats()
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, request: Request):
+    if "steamid" not in request.session:
+        raise HTTPException(401, "Unauthorized")
+    job = get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return asdict(job)
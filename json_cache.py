@@ -0,0 +1,131 @@
+# json_cache.py
+"""
+Кэш готовых JSON‑инвентарей в inventoryJson/.
+
+Файл адресуется ключом содержимого: steamid + последний updated_at
+инвентаря + версия таблицы цен + время курсов валют. Этот же ключ
+служит ETag'ом ответа /getjsoninv. Запись атомарная (temp + rename),
+старые записи вытесняются по возрасту и суммарному размеру.
+"""
+import os
+import re
+import time
+import uuid
+import hashlib
+import logging
+
+import price_cache
+import rates
+from settings import ROOT_DIR, config
+
+JSON_DIR = os.path.join(ROOT_DIR, "inventoryJson")
+os.makedirs(JSON_DIR, exist_ok=True)
+
+# === НАСТРОЙКИ ===
+MAX_AGE = config.getint("jsoncache", "max_age_hours", fallback=24) * 3600
+MAX_SIZE = config.getint("jsoncache", "max_size_mb", fallback=512) * 1024 * 1024
+EVICT_INTERVAL = 60                      # сек. между проходами вытеснения
+
+# ключ меняется и при смене формата ответа
+FORMAT_VERSION = 1
+
+# только файлы кэша: <steamid>.<ключ>.json — прочие файлы каталога не трогаем
+CACHE_FILE_RE = re.compile(r"^(\d+)\.([0-9a-f]{20})\.json$")
+
+_evicted_at = 0.0
+
+
+async def cache_key(conn, steamid: str) -> str:
+    inv_ts = await conn.fetchval(
+        "SELECT MAX(updated_at) FROM user_inventory WHERE steamid = $1", steamid
+    )
+    price_v = await price_cache.current_version(conn)
+    # время курсов — из снимка, по которому реально считаются цены
+    snap = rates.snapshot()
+    fx_ts = snap.rates_time if snap else None
+    raw = f"{FORMAT_VERSION}|{steamid}|{inv_ts}|{price_v}|{fx_ts}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def etag_matches(if_none_match: str | None, key: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/").strip('"') for t in if_none_match.split(",")}
+    return key in tags or "*" in tags
+
+
+def path_for(steamid: str, key: str) -> str:
+    return os.path.join(JSON_DIR, f"{steamid}.{key}.json")
+
+
+def lookup(steamid: str, key: str) -> str | None:
+    path = path_for(steamid, key)
+    return path if os.path.exists(path) else None
+
+
+def tmp_path_for(steamid: str, key: str) -> str:
+    """Свой файл на каждую сборку: одновременные запросы не пишут в один tmp."""
+    return f"{path_for(steamid, key)}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+
+def commit(steamid: str, key: str, tmp_path: str) -> str:
+    """Атомарно публикует файл и удаляет прежние записи этого steamid."""
+    path = path_for(steamid, key)
+    os.replace(tmp_path, path)
+
+    for name in os.listdir(JSON_DIR):
+        m = CACHE_FILE_RE.match(name)
+        if m and m.group(1) == steamid and m.group(2) != key:
+            _remove(os.path.join(JSON_DIR, name))
+
+    evict()
+    return path
+
+
+def write_bytes(steamid: str, key: str, data: bytes) -> str:
+    tmp_path = tmp_path_for(steamid, key)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    return commit(steamid, key, tmp_path)
+
+
+def evict(force: bool = False) -> None:
+    """Удаляет записи старше MAX_AGE, затем самые старые — пока кэш больше MAX_SIZE."""
+    global _evicted_at
+    now = time.time()
+    if not force and now - _evicted_at < EVICT_INTERVAL:
+        return
+    _evicted_at = now
+
+    entries = []
+    for name in os.listdir(JSON_DIR):
+        if not CACHE_FILE_RE.match(name):
+            continue
+        path = os.path.join(JSON_DIR, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if now - st.st_mtime > MAX_AGE:
+            _remove(path)
+        else:
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= MAX_SIZE:
+            break
+        _remove(path)
+        total -= size
+        removed += 1
+
+    if removed:
+        logging.info(f"🧹 JSON‑кэш: вытеснено {removed} файлов по размеру")
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,23 +1,51 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 # ── приложные роутеры ────────────────────────────────
-from auth import router as auth_router
+from auth import router as auth_router, require_admin
 from inventory import router as inventory_router
 from routers import steamid_resolver
 from routers import inventory_json
+from routers import price_history
+from routers import portfolio
 
 # ── конфиг / секреты ────────────────────────────────
-import configparser
-import os
-
-config = configparser.ConfigParser()
-config.read(os.path.join(os.path.dirname(__file__), "config.ini"))
+from settings import config
+import db
+import http_client
+import inventory
+import jobs
+import metrics
+import rates
+import scheduler
 
 SESSION_SECRET = config["app"]["session_secret"]
 
-app = FastAPI()
+
+# ── жизненный цикл: пул БД, схема, HTTP-клиент, очередь, синхронизации
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.pool = await db.init_pool(getattr(app.state, "db_dsn", None))
+    # схема до первого запроса: /getjsoninv читает сводку сразу
+    await inventory.migrate()
+    app.state.http = await http_client.start()
+    await rates.start()
+    await jobs.start()
+    await scheduler.start()
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        await jobs.stop()
+        await rates.stop()
+        await http_client.stop()
+        await db.close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ── CORS (боевой домен + локальная разработка) ────────
 app.add_middleware(
@@ -46,3 +74,15 @@ app.include_router(auth_router)                   # авторизация
 app.include_router(steamid_resolver.router)       # /{appid}/steamid
 app.include_router(inventory_router)              # /inventory/{steamid}/{appid}
 app.include_router(inventory_json.router)         # /getjsoninv/{steamid}
+app.include_router(jobs.router)                   # /jobs/{job_id}
+app.include_router(rates.router)                  # /rates
+app.include_router(scheduler.router)              # /sync, /sync/{name}
+app.include_router(metrics.router)                # /metrics
+app.include_router(price_history.router)          # /prices/history, /prices/ohlc
+app.include_router(portfolio.router)              # /portfolio/{steamid}
+
+
+# ── служебное ────────────────────────────────────────
+@app.get("/dbstats", dependencies=[Depends(require_admin)])
+async def dbstats():
+    return db.pool_stats()
@@ -0,0 +1,184 @@
+# metrics.py
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+Доступ — как у прочих служебных эндпоинтов (auth.require_admin):
+скрейпер пускается по адресу из [admin] allow_ips.
+
+Счётчики и гистограммы живут в памяти процесса — без prometheus_client,
+формат 0.0.4 простой. При нескольких воркерах uvicorn каждый отдаёт
+свои значения; суммирует Prometheus по instance/pid.
+"""
+import time
+import math
+from contextlib import contextmanager
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from auth import require_admin
+
+router = APIRouter()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+_registry: list = []
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Значение считается в момент выдачи /metrics: fn() → {labels tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple, fn):
+        super().__init__(name, doc, labelnames)
+        self._fn = fn
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, v in sorted(self._fn().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for key, (counts, total, n) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = _labels(self.labelnames, key, f'le="{_fmt(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lbl = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{lbl} {_fmt(total)}")
+            lines.append(f"{self.name}_count{lbl} {n}")
+        return lines
+
+
+# ───── метрики приложения ─────────────────────────────
+UPSTREAM_PAGE_SECONDS = Histogram(
+    "inventory_upstream_page_seconds", "Latency of one steamapis inventory page fetch", ("appid",)
+)
+INVENTORY_ITEMS = Histogram(
+    "inventory_items", "Items per fetched inventory", ("appid",), buckets=SIZE_BUCKETS
+)
+INVENTORY_DB_WRITE_SECONDS = Histogram(
+    "inventory_db_write_seconds", "Time to store one inventory (stage, upsert, summary)"
+)
+GETJSONINV_SECONDS = Histogram(
+    "getjsoninv_stage_seconds", "/getjsoninv time by stage (query, compose, serialize)", ("stage",)
+)
+VANITY_SECONDS = Histogram(
+    "vanity_resolve_seconds", "Vanity URL resolution latency by source", ("source",)
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result")
+)
+SYNC_SECONDS = Histogram(
+    "sync_duration_seconds", "Scheduled sync duration by outcome", ("sync", "outcome")
+)
+
+
+def cache_hit(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _hit_ratios() -> dict:
+    caches = {key[0] for key in CACHE_REQUESTS._values}
+    out = {}
+    for cache in caches:
+        hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+        total = hits + CACHE_REQUESTS.value(cache=cache, result="miss")
+        out[(cache,)] = hits / total if total else 0.0
+    return out
+
+
+Gauge("cache_hit_ratio", "Cache hit ratio since process start", ("cache",), _hit_ratios)
+
+
+def render() -> str:
+    return "\n".join(line for m in _registry for line in m.render()) + "\n"
+
+
+# ───── эндпоинт ───────────────────────────────────────
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def metrics_endpoint():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,142 @@
+# portfolio.py
+"""
+История стоимости инвентарей: (steamid, appid) → сумма в USD и во всех
+валютах из curse на момент записи.
+
+Запись инкрементальная. inventory.py переоценивает одного пользователя
+после записи его инвентаря. item_steam_apis при обновлении цен
+помечает в portfolio_touched только тех, у кого сменилась цена
+хотя бы одной позиции (поиск держателей — по индексу
+user_inventory_summary (appid, market_hash_name)), и переоценивает
+только их. В portfolio_history строка попадает, лишь если сумма или
+число предметов отличаются от portfolio_last.
+
+SCHEMA_SQL выполняет только inventory.migrate при старте приложения.
+В транзакциях записи DDL нет: CREATE INDEX IF NOT EXISTS берёт
+ShareLock на таблицу, даже если индекс уже есть, и блокирует запись
+инвентарей (а встречные блокировки дают взаимоблокировку). Пока
+миграция не прошла, синхронизация цен историю стоимости не пишет.
+
+Модуль без зависимостей от драйвера: SQL общий для psycopg2 (синхронизация
+цен) и asyncpg (приложение).
+"""
+TOUCHED_TABLE = "portfolio_touched"
+
+# цена предмета в USD (алиас p — steamapis_items или её дельта): первая
+# ненулевая из prise_24h → prise_7d → avg. Одна на сборку сводки
+# (inventory) и её переоценку (item_steam_apis)
+PRICE_EXPR = "COALESCE(NULLIF(p.prise_24h, 0), NULLIF(p.prise_7d, 0), NULLIF(p.avg, 0), 0)"
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS portfolio_history (
+        steamid TEXT NOT NULL,
+        appid INTEGER NOT NULL,
+        ts TIMESTAMP NOT NULL,
+        total_usd NUMERIC NOT NULL,
+        items INTEGER NOT NULL,
+        totals JSONB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS portfolio_history_idx
+        ON portfolio_history (steamid, appid, ts);
+
+    CREATE TABLE IF NOT EXISTS portfolio_last (
+        steamid TEXT NOT NULL,
+        appid INTEGER NOT NULL,
+        total_usd NUMERIC NOT NULL,
+        items INTEGER NOT NULL,
+        ts TIMESTAMP NOT NULL,
+        PRIMARY KEY (steamid, appid)
+    );
+
+    -- предмет → держатели: переоценка только владельцев подорожавших позиций
+    CREATE INDEX IF NOT EXISTS user_inventory_summary_item_idx
+        ON user_inventory_summary (appid, market_hash_name);
+"""
+
+# единиц валюты за 1 USD — как rates.compute_factors, но в SQL
+_FX_CTE = """
+    usd AS (
+        SELECT curse FROM curse WHERE valute = 'USD' AND curse > 0
+    ),
+    fx AS (
+        SELECT 'USD' AS cur, 1::numeric AS factor
+        UNION ALL
+        SELECT 'RUB', curse FROM usd
+        UNION ALL
+        SELECT c.valute, usd.curse / c.curse
+        FROM curse c, usd
+        WHERE c.valute NOT IN ('USD', 'RUB') AND c.curse > 0
+    ),"""
+
+_NO_FX_CTE = """
+    fx AS (
+        SELECT 'USD' AS cur, 1::numeric AS factor
+    ),"""
+
+
+def record_sql(where: str, has_rates: bool) -> str:
+    """
+    Пересчёт сумм по user_inventory_summary для строк, отобранных where
+    (алиас s), и запись изменившихся в portfolio_history.
+    has_rates — есть ли таблица curse; без неё суммы только в USD.
+    """
+    return f"""
+        WITH {_FX_CTE if has_rates else _NO_FX_CTE}
+        totals AS (
+            SELECT s.steamid, s.appid, SUM(s.total_usd) AS total_usd, SUM(s.count)::int AS items
+            FROM user_inventory_summary s
+            WHERE {where}
+            GROUP BY s.steamid, s.appid
+        ),
+        changed AS (
+            INSERT INTO portfolio_last AS l (steamid, appid, total_usd, items, ts)
+            SELECT steamid, appid, total_usd, items, NOW() AT TIME ZONE 'UTC'
+            FROM totals
+            ON CONFLICT (steamid, appid) DO UPDATE SET
+                total_usd = EXCLUDED.total_usd,
+                items = EXCLUDED.items,
+                ts = EXCLUDED.ts
+            WHERE (l.total_usd, l.items) IS DISTINCT FROM (EXCLUDED.total_usd, EXCLUDED.items)
+            RETURNING steamid, appid, total_usd, items, ts
+        )
+        INSERT INTO portfolio_history (steamid, appid, ts, total_usd, items, totals)
+        SELECT
+            c.steamid, c.appid, c.ts, c.total_usd, c.items,
+            (SELECT jsonb_object_agg(fx.cur, round(c.total_usd * fx.factor, 2)) FROM fx)
+        FROM changed c
+    """
+
+
+# ───── psycopg2: обновление цен ───────────────────────
+def open_touched(cur) -> None:
+    """Пустой список переоценённых (steamid, appid) до конца транзакции."""
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {TOUCHED_TABLE} (
+            steamid TEXT NOT NULL,
+            appid INTEGER NOT NULL
+        ) ON COMMIT DROP;
+        TRUNCATE {TOUCHED_TABLE};
+    """)
+
+
+def revalue_touched(cur) -> int:
+    """Записывает стоимость пользователей из portfolio_touched; возвращает число новых точек."""
+    cur.execute("""
+        SELECT to_regclass('portfolio_last') IS NOT NULL, to_regclass('curse') IS NOT NULL
+    """)
+    has_schema, has_rates = cur.fetchone()
+    if not has_schema:
+        return 0
+    cur.execute(record_sql(
+        f"(s.steamid, s.appid) IN (SELECT steamid, appid FROM {TOUCHED_TABLE})", has_rates
+    ))
+    return cur.rowcount
+
+
+# ───── asyncpg: запись инвентаря ──────────────────────
+async def record(conn, steamid: str, appid: int) -> None:
+    """Точка стоимости одного инвентаря; вызывается внутри транзакции записи."""
+    has_rates = await conn.fetchval("SELECT to_regclass('curse') IS NOT NULL")
+    await conn.execute(
+        record_sql("s.steamid = $1 AND s.appid = $2", has_rates), steamid, appid
+    )
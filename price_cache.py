@@ -0,0 +1,35 @@
+# price_cache.py
+"""
+Версия таблицы цен steamapis_items для ключа JSON‑кэша (json_cache).
+
+item_steam_apis поднимает номер в steamapis_version в той же транзакции,
+что меняет цены и переоценивает user_inventory_summary; сами цены
+приложение читает из сводки, здесь только номер версии. В БД за ним
+ходим не чаще раза в VERSION_CHECK_INTERVAL.
+"""
+import time
+
+VERSION_TABLE = "steamapis_version"
+VERSION_CHECK_INTERVAL = 5.0             # сек. между проверками версии
+
+_known_version: int | None = None
+_checked_at = 0.0
+
+
+async def _fetch_version(conn) -> int:
+    # таблицы ещё нет (цены ни разу не загружались) — версия 0; проверка
+    # через to_regclass, а не по ошибке: ошибка оборвала бы транзакцию вызывающего
+    if not await conn.fetchval(f"SELECT to_regclass('{VERSION_TABLE}') IS NOT NULL"):
+        return 0
+    v = await conn.fetchval(f"SELECT version FROM {VERSION_TABLE} WHERE id = 1")
+    return v or 0
+
+
+async def current_version(conn) -> int:
+    """Версия таблицы цен; в БД ходим не чаще VERSION_CHECK_INTERVAL."""
+    global _known_version, _checked_at
+    now = time.monotonic()
+    if _known_version is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+        _known_version = await _fetch_version(conn)
+        _checked_at = now
+    return _known_version
@@ -0,0 +1,56 @@
+# pricing.py
+"""
+Пересчёт цен инвентаря в валюты сразу для всех позиций.
+
+prices[i][cur]      = round(price_usd[i] * fx[cur], 2)
+prices_full[i][cur] = round(prices[i][cur] * count[i], 2)
+
+С NumPy считается матрицами (позиции × валюты). Результат совпадает с
+поштучным round() бит в бит: значения, которые после умножения на 100
+оказались на расстоянии пары ulp от половины, досчитываются обычным
+round() — только там np.rint и точное десятичное округление Python
+могут разойтись. Без NumPy — поштучный путь.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def price_row(price_usd: float, count: int, fx: dict) -> tuple[dict, dict]:
+    """Поштучный расчёт одной позиции (эталон и запасной путь)."""
+    prices = {cur: round(price_usd * coef, 2) for cur, coef in fx.items()}
+    prices_full = {cur: round(p * count, 2) for cur, p in prices.items()}
+    return prices, prices_full
+
+
+def _round2(values):
+    """np.round(values, 2), но с точностью Python round() на «почти половинах»."""
+    scaled = values * 100.0
+    out = np.rint(scaled) / 100.0
+
+    risky = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.spacing(scaled)
+    if risky.any():
+        idx = np.nonzero(risky)
+        out[idx] = [round(v, 2) for v in values[idx].tolist()]
+    return out
+
+
+def price_rows(price_usd: list, counts: list, fx: dict) -> tuple[list[dict], list[dict]]:
+    """prices и prices_full для всех позиций; порядок валют — как в fx."""
+    if np is None or not price_usd:
+        pairs = [price_row(p, c, fx) for p, c in zip(price_usd, counts)]
+        return [p for p, _ in pairs], [f for _, f in pairs]
+
+    curs = list(fx)
+    coefs = np.array([fx[c] for c in curs], dtype=np.float64)
+    usd = np.asarray(price_usd, dtype=np.float64)[:, None]
+    cnt = np.asarray(counts, dtype=np.float64)[:, None]
+
+    prices = _round2(usd * coefs)
+    prices_full = _round2(prices * cnt)
+
+    return (
+        [dict(zip(curs, row)) for row in prices.tolist()],
+        [dict(zip(curs, row)) for row in prices_full.tolist()],
+    )
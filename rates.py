@@ -0,0 +1,177 @@
+# rates.py
+"""
+Снимок курсов валют из таблицы curse в памяти процесса.
+
+Курсы читаются один раз при старте, затем по таймеру и по NOTIFY
+curse_updated от curse_sync. Запросы берут коэффициенты из памяти.
+LISTEN живёт на отдельном соединении вне пула и переподключается с
+нарастающей паузой; пока его нет, курсы обновляет только таймер.
+Если обновление не удалось (нет USD, пустая таблица, ошибка БД),
+остаётся последний удачный снимок — его возраст виден в /rates.
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import APIRouter
+
+import db
+from settings import config
+
+router = APIRouter()
+
+# === НАСТРОЙКИ ===
+REFRESH_INTERVAL = config.getint("rates", "refresh_seconds", fallback=300)
+CHANNEL = "curse_updated"
+LISTEN_CHECK = 60                      # проверка живости LISTEN‑соединения, с
+LISTEN_RETRY_MAX = 60                  # потолок паузы между переподключениями, с
+
+
+class RatesUnavailable(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class RatesSnapshot:
+    factors: dict[str, float]          # единиц валюты за 1 USD
+    rates_time: datetime | None        # MAX(time) из curse
+    loaded_at: float                   # time.time() загрузки
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.loaded_at
+
+
+_snapshot: RatesSnapshot | None = None
+_last_error: str | None = None
+_timer: asyncio.Task | None = None
+_listen_task: asyncio.Task | None = None
+_listener = None                       # отдельное соединение под LISTEN
+_pending: set[asyncio.Task] = set()
+
+
+def compute_factors(rub_per: dict[str, float]) -> dict[str, float]:
+    """{валюта: рублей за единицу} → {валюта: единиц за 1 USD}."""
+    rub_per_usd = rub_per["USD"]
+
+    factors = {"USD": 1.0, "RUB": rub_per_usd}
+    for cur, rub_val in rub_per.items():
+        if cur in ("USD", "RUB") or not rub_val:
+            continue
+        factors[cur] = rub_per_usd / rub_val
+    return factors
+
+
+async def refresh() -> bool:
+    global _snapshot, _last_error
+    try:
+        async with db.acquire() as conn:
+            rows = await conn.fetch("SELECT valute, curse, time FROM curse")
+
+        rub_per = {r["valute"]: float(r["curse"]) for r in rows}
+        if not rub_per.get("USD"):
+            raise ValueError("в curse нет курса USD")
+
+        _snapshot = RatesSnapshot(
+            factors=compute_factors(rub_per),
+            rates_time=max(r["time"] for r in rows),
+            loaded_at=time.time(),
+        )
+        _last_error = None
+        return True
+
+    except Exception as e:
+        _last_error = str(e)
+        age = f"{_snapshot.age:.0f} с" if _snapshot else "нет снимка"
+        logging.error(f"❌ Курсы валют не обновлены ({e}); последний снимок: {age}")
+        return False
+
+
+def snapshot() -> RatesSnapshot | None:
+    return _snapshot
+
+
+async def get_factors() -> dict[str, float]:
+    if _snapshot is None and not await refresh():
+        raise RatesUnavailable(_last_error)
+    return _snapshot.factors
+
+
+# === Жизненный цикл ===
+async def start() -> None:
+    global _timer, _listen_task
+    await refresh()
+
+    _listen_task = asyncio.create_task(_listen_loop())
+    _timer = asyncio.create_task(_refresh_loop())
+
+
+async def stop() -> None:
+    global _timer, _listen_task
+    for task in (_timer, _listen_task):
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    _timer = _listen_task = None
+
+
+def _on_notify(conn, pid, channel, payload) -> None:
+    logging.info("💱 NOTIFY curse_updated — перечитываем курсы")
+    task = asyncio.create_task(refresh())
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _listen_loop() -> None:
+    global _listener
+    delay = 1
+    connected_once = False
+    while True:
+        lost = asyncio.Event()
+        try:
+            _listener = await db.connect()
+            _listener.add_termination_listener(lambda conn: lost.set())
+            await _listener.add_listener(CHANNEL, _on_notify)
+            logging.info(f"👂 LISTEN {CHANNEL}")
+            if connected_once:
+                await refresh()        # NOTIFY, пришедшие без соединения, потеряны
+            connected_once = True
+            delay = 1
+
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), LISTEN_CHECK)
+                except asyncio.TimeoutError:
+                    await asyncio.wait_for(_listener.execute("SELECT 1"), 10)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"⚠️ LISTEN {CHANNEL} недоступен ({e}); курсы — только по таймеру")
+        finally:
+            conn, _listener = _listener, None
+            if conn is not None and not conn.is_closed():
+                conn.terminate()
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(REFRESH_INTERVAL)
+        await refresh()
+
+
+# === Эндпоинт ===
+@router.get("/rates")
+async def rates_status():
+    snap = _snapshot
+    return {
+        "factors":     snap.factors if snap else None,
+        "rates_time":  snap.rates_time.isoformat() if snap and snap.rates_time else None,
+        "age_seconds": round(snap.age, 1) if snap else None,
+        "last_error":  _last_error,
+    }
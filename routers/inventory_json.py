@@ -1,32 +1,33 @@
 # routers/inventory_json.py
 import os
 import json
+import asyncio
+import time
+import base64
+import hashlib
 import logging
+from decimal import Decimal, InvalidOperation
 from datetime import timedelta
 
 import asyncpg
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse
-import configparser
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+from fastapi.responses import Response, FileResponse, StreamingResponse
 
-router = APIRouter()
-
-# ───── конфиг ─────────────────────────────────────────
-config = configparser.ConfigParser()
-ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-config.read(os.path.join(ROOT_DIR, "config.ini"))
+import db
+import json_cache
+import metrics
+import pricing
+import rates
+from settings import ROOT_DIR, config
 
-DB_CONFIG = {
-    "user":     config["database"]["user"],
-    "password": config["database"]["password"],
-    "database": config["database"]["dbname"],
-    "host":     config["database"]["host"],
-    "port":     config.getint("database", "port"),
-}
+try:
+    import orjson                      # опционально: быстрая сериализация
+except ImportError:
+    orjson = None
 
-JSON_DIR = os.path.join(ROOT_DIR, "inventoryJson")
-os.makedirs(JSON_DIR, exist_ok=True)
+router = APIRouter()
 
+# ───── конфиг ─────────────────────────────────────────
 LOG_DIR = os.path.join(ROOT_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 logging.basicConfig(
@@ -37,56 +38,183 @@ logging.basicConfig(
 
 MSK = timedelta(hours=3)
 
+# потоковая отдача: строки сводки читаются одним запросом до первого байта
+# (соединение сразу возвращается в пул — медленный клиент его не держит),
+# JSON собирается и отправляется кусками по STREAM_BATCH позиций
+STREAMING = config.getboolean("getjsoninv", "streaming", fallback=True)
+STREAM_BATCH = config.getint("getjsoninv", "stream_batch", fallback=500)
+
+# страницы: фильтры, сортировка и keyset-курсор считаются в SQL
+PAGE_SIZE = config.getint("getjsoninv", "page_size", fallback=100)
+PAGE_MAX = config.getint("getjsoninv", "page_max", fallback=1000)
+
+# холодная сборка (steamid, key) — одна на процесс: остальные запросы ждут
+# её файл не дольше BUILD_WAIT секунд, потом собирают сами
+BUILD_WAIT = config.getfloat("getjsoninv", "build_wait_seconds", fallback=10)
+_building: dict[tuple[str, str], asyncio.Future] = {}
+
+# сводка строится в inventory.py при записи инвентаря и переоценивается
+# при обновлении цен — здесь только чтение по индексу (steamid, appid)
+USER_INVENTORY_SQL = """
+    SELECT
+        appid,
+        market_hash_name,
+        tradable,
+        marketable,
+        icon_url,
+        updated_at,
+        count,
+        price_usd
+    FROM user_inventory_summary
+    WHERE steamid = $1
+"""
+
 # ───── SQL‑helpers ────────────────────────────────────
 async def _get_user_inventory(conn, steamid):
-    return await conn.fetch(
-        """
+    return await conn.fetch(USER_INVENTORY_SQL, steamid)
+
+
+# ───── single-flight сборки ───────────────────────────
+async def _wait_for_build(steamid: str, key: str) -> str | None:
+    """Если этот ключ уже собирает другой запрос — ждём и берём его файл."""
+    build = _building.get((steamid, key))
+    if build is None:
+        return None
+    try:
+        await asyncio.wait_for(asyncio.shield(build), BUILD_WAIT)
+    except asyncio.TimeoutError:
+        # ведущий запрос завис или так и не начал отдачу — больше его не ждём
+        if _building.get((steamid, key)) is build:
+            del _building[(steamid, key)]
+    return json_cache.lookup(steamid, key)
+
+
+def _start_build(steamid: str, key: str) -> asyncio.Future:
+    build = asyncio.get_running_loop().create_future()
+    _building.setdefault((steamid, key), build)
+    return build
+
+
+def _finish_build(steamid: str, key: str, build: asyncio.Future) -> None:
+    if not build.done():
+        build.set_result(None)
+    if _building.get((steamid, key)) is build:
+        del _building[(steamid, key)]
+
+
+# ───── страницы ───────────────────────────────────────
+# ключ сортировки → колонка; у каждой индекс (steamid, колонка, id)
+SORT_COLUMNS = {"price": "price_usd", "count": "count", "total": "total_usd"}
+
+
+def _encode_cursor(sort: str, order: str, value, row_id: int) -> str:
+    raw = f"{sort}:{order}:{value}:{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    """(значение ключа, id) последней строки прошлой страницы; чужой курсор — 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        c_sort, c_order, value, row_id = raw.split(":")
+        if (c_sort, c_order) != (sort, order):
+            raise ValueError("cursor from another sort")
+        value = int(value) if sort == "count" else Decimal(value)
+        return value, int(row_id)
+    except (ValueError, UnicodeDecodeError, InvalidOperation):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _page_query(steamid: str, f: dict, sort: str, order: str, after, limit: int) -> tuple[str, list]:
+    """SELECT страницы сводки; f — фильтры, уже приведённые к USD и 0/1."""
+    args: list = [steamid]
+    where = ["steamid = $1"]
+
+    def arg(value) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    if f["appid"] is not None:
+        where.append(f"appid = {arg(f['appid'])}")
+    if f["tradable"] is not None:
+        where.append(f"tradable = {arg(f['tradable'])}")
+    if f["marketable"] is not None:
+        where.append(f"marketable = {arg(f['marketable'])}")
+    if f["q"]:
+        # ILIKE '%…%' обслуживает триграммный индекс
+        where.append(f"market_hash_name ILIKE {arg('%' + _escape_like(f['q']) + '%')}")
+    if f["min_usd"] is not None:
+        where.append(f"price_usd >= {arg(f['min_usd'])}")
+    if f["max_usd"] is not None:
+        where.append(f"price_usd <= {arg(f['max_usd'])}")
+
+    col = SORT_COLUMNS[sort]
+    if after is not None:
+        op = "<" if order == "desc" else ">"
+        where.append(f"({col}, id) {op} ({arg(after[0])}, {arg(after[1])})")
+
+    sql = f"""
         SELECT
+            id,
             appid,
             market_hash_name,
             tradable,
             marketable,
-            MIN(icon_url)   AS icon_url,     -- берём первый по алфавиту
-            MAX(updated_at) AS updated_at,
-            COUNT(*)        AS count
-        FROM user_inventory
-        WHERE steamid = $1
-        GROUP BY appid, market_hash_name, tradable, marketable
-        """,
-        steamid,
-    )
+            icon_url,
+            updated_at,
+            count,
+            price_usd,
+            {col} AS sort_value
+        FROM user_inventory_summary
+        WHERE {" AND ".join(where)}
+        ORDER BY {col} {order}, id {order}
+        LIMIT {arg(limit + 1)}
+    """
+    return sql, args
 
 
+def _page_etag(key: str, params: dict) -> str:
+    # страница зависит от того же ключа содержимого и от своих параметров
+    raw = key + "|" + json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
 
-async def _get_price_map(conn):
-    rows = await conn.fetch(
-        "SELECT appid, market_hash_name, prise_24h, prise_7d, avg FROM steamapis_items"
-    )
-    mp = {}
-    for r in rows:
-        price = r["prise_24h"] or r["prise_7d"] or r["avg"] or 0
-        mp[(r["appid"], r["market_hash_name"])] = float(price)
-    return mp
 
+async def _inventory_page(pool, steamid: str, f: dict, sort: str, order: str, cursor, limit, factors) -> dict:
+    after = _decode_cursor(cursor, sort, order) if cursor else None
+    sql, args = _page_query(steamid, f, sort, order, after, limit)
 
-async def _get_currency_factors(conn):
-    rows = await conn.fetch("SELECT valute, curse FROM curse")
-    rub_per = {r["valute"]: float(r["curse"]) for r in rows}
-    rub_per_usd = rub_per["USD"]
+    with metrics.GETJSONINV_SECONDS.time(stage="query"):
+        async with db.acquire(pool) as conn:
+            rows = await conn.fetch(sql, *args)
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    with metrics.GETJSONINV_SECONDS.time(stage="compose"):
+        items = _compose_items(rows, factors)
+
+    next_cursor = None
+    if more:
+        last = rows[-1]
+        next_cursor = _encode_cursor(sort, order, last["sort_value"], last["id"])
+    return {"items": items, "next_cursor": next_cursor}
 
-    factors = {"USD": 1.0, "RUB": rub_per_usd}
-    for cur, rub_val in rub_per.items():
-        if cur in ("USD", "RUB"):
-            continue
-        factors[cur] = rub_per_usd / rub_val
-    return factors
 
 # ───── JSON‑builder ───────────────────────────────────
-def _compose_item_json(rec, price_usd, fx):
-    # округление до 2 знаков
-    prices = {cur: round(price_usd * coef, 2) for cur, coef in fx.items()}
-    prices_full = {cur: round(p * rec["count"], 2) for cur, p in prices.items()}
+def _compose_items(rows, fx):
+    # цены во всех валютах — одним пакетом по всем позициям (pricing.price_rows)
+    prices, prices_full = pricing.price_rows(
+        [float(r["price_usd"]) for r in rows], [r["count"] for r in rows], fx
+    )
+    return [
+        _compose_item_json(r, p, pf) for r, p, pf in zip(rows, prices, prices_full)
+    ]
+
 
+def _compose_item_json(rec, prices, prices_full):
     return {
         "appid":            rec["appid"],
         "market_hash_name": rec["market_hash_name"],
@@ -99,33 +227,196 @@ def _compose_item_json(rec, price_usd, fx):
         "prices_full":      prices_full,
     }
 
+def _dumps(obj) -> bytes:
+    # тот же компактный вид, что у JSONResponse: без пробелов, UTF‑8 как есть
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def _stream_inventory(rows, steamid, key, factors, query_s, build):
+    """
+    Отдаёт JSON‑массив кусками по STREAM_BATCH позиций, параллельно
+    записывая те же байты в JSON‑кэш под ключом key. Строки уже в памяти;
+    целиком в памяти не бывает только готового JSON.
+    """
+    tmp_path = json_cache.tmp_path_for(steamid, key)
+    committed = False
+    spent = {"query": query_s, "compose": 0.0, "serialize": 0.0}   # суммарно по пачкам
+
+    try:
+        with open(tmp_path, "wb") as f:
+            for start in range(0, len(rows), STREAM_BATCH):
+                t1 = time.perf_counter()
+                items = _compose_items(rows[start:start + STREAM_BATCH], factors)
+                t2 = time.perf_counter()
+                chunk = (b"," if start else b"[") + b",".join(_dumps(item) for item in items)
+                spent["compose"] += t2 - t1
+                spent["serialize"] += time.perf_counter() - t2
+                f.write(chunk)
+                yield chunk
+
+            tail = b"]" if rows else b"[]"
+            f.write(tail)
+            yield tail
+
+        file_path = json_cache.commit(steamid, key, tmp_path)
+        committed = True
+        for stage, sec in spent.items():
+            metrics.GETJSONINV_SECONDS.observe(sec, stage=stage)
+        logging.info(f"✅ {file_path} создан ({len(rows)} позиций)")
+
+    except Exception as e:
+        # заголовки уже ушли — остаётся оборвать поток
+        logging.critical(f"🔥 Ошибка JSON‑инвентаря (поток): {e}")
+        raise
+
+    finally:
+        # в т.ч. обрыв клиентом (GeneratorExit / CancelledError)
+        if not committed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        _finish_build(steamid, key, build)
+
 # ───── endpoint ───────────────────────────────────────
 @router.get("/getjsoninv/{steamid}")
-async def generate_json_inventory(steamid: str, request: Request):
+async def generate_json_inventory(
+    steamid: str,
+    request: Request,
+    appid: int | None = None,
+    tradable: bool | None = None,
+    marketable: bool | None = None,
+    q: str | None = Query(None, max_length=200, description="подстрока market_hash_name"),
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    currency: str | None = Query(None, description="валюта min_price/max_price, по умолчанию USD"),
+    sort: str | None = Query(None, description="price | count | total"),
+    order: str | None = Query(None, description="asc | desc, по умолчанию desc"),
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=PAGE_MAX),
+    pool: asyncpg.Pool = Depends(db.get_pool),
+):
+    """
+    Без параметров — весь инвентарь массивом (файловый кэш, поток).
+    С любым из фильтров, currency, sort, order, cursor или limit — страница
+    {"items": [...], "next_cursor": ...}; следующая запрашивается
+    с теми же параметрами и cursor. Диапазон цены — в currency.
+    """
     if "steamid" not in request.session:
         raise HTTPException(401, "Unauthorized")
 
+    # steamid попадает в имя файла кэша
+    if not steamid.isdigit():
+        raise HTTPException(400, "Invalid steamid")
+
+    # курсы нужны до первого байта ответа: без снимка — 503, а не оборванный поток
+    try:
+        factors = await rates.get_factors()
+    except rates.RatesUnavailable:
+        raise HTTPException(503, "Currency rates unavailable")
+
+    try:
+        async with db.acquire(pool) as conn:
+            key = await json_cache.cache_key(conn, steamid)
+    except Exception as e:
+        logging.critical(f"🔥 Ошибка ключа JSON‑кэша: {e}")
+        raise HTTPException(500, "Internal error")
+
+    paged = any(
+        v is not None
+        for v in (
+            appid, tradable, marketable, q, min_price, max_price,
+            currency, sort, order, cursor, limit,
+        )
+    )
+    if paged:
+        sort = sort or "total"
+        order = order or "desc"
+        currency = currency or "USD"
+        if sort not in SORT_COLUMNS:
+            raise HTTPException(400, f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+        if order not in ("asc", "desc"):
+            raise HTTPException(400, "order must be asc or desc")
+        fx = factors.get(currency.upper())
+        if not fx:
+            raise HTTPException(400, "Unknown currency")
+
+        # цена в сводке — в USD: границы переводим по текущему курсу
+        f = {
+            "appid":      appid,
+            "tradable":   None if tradable is None else int(tradable),
+            "marketable": None if marketable is None else int(marketable),
+            "q":          q,
+            "min_usd":    None if min_price is None else Decimal(str(min_price / fx)),
+            "max_usd":    None if max_price is None else Decimal(str(max_price / fx)),
+        }
+        limit = limit or PAGE_SIZE
+        etag = _page_etag(key, {**f, "sort": sort, "order": order, "cursor": cursor, "limit": limit})
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+        if json_cache.etag_matches(request.headers.get("if-none-match"), etag):
+            metrics.cache_hit("getjsoninv_etag", True)
+            return Response(status_code=304, headers=headers)
+
+        try:
+            page = await _inventory_page(pool, steamid, f, sort, order, cursor, limit, factors)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logging.critical(f"🔥 Ошибка страницы JSON‑инвентаря: {e}")
+            raise HTTPException(500, "Internal error")
+
+        with metrics.GETJSONINV_SECONDS.time(stage="serialize"):
+            data = _dumps(page)
+        return Response(content=data, media_type="application/json", headers=headers)
+
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+
+    if json_cache.etag_matches(request.headers.get("if-none-match"), key):
+        metrics.cache_hit("getjsoninv_etag", True)
+        return Response(status_code=304, headers=headers)
+
+    cached = json_cache.lookup(steamid, key) or await _wait_for_build(steamid, key)
+    metrics.cache_hit("getjsoninv_file", cached is not None)
+    if cached is not None:
+        return FileResponse(cached, media_type="application/json", headers=headers)
+
     logging.info(f"🚀 Формирование JSON для {steamid}")
+    build = _start_build(steamid, key)
+
+    if STREAMING:
+        try:
+            t0 = time.perf_counter()
+            async with db.acquire(pool) as conn:
+                rows = await _get_user_inventory(conn, steamid)
+            query_s = time.perf_counter() - t0
+        except Exception as e:
+            _finish_build(steamid, key, build)
+            logging.critical(f"🔥 Ошибка JSON‑инвентаря: {e}")
+            raise HTTPException(500, "Internal error")
+
+        return StreamingResponse(
+            _stream_inventory(rows, steamid, key, factors, query_s, build),
+            media_type="application/json",
+            headers=headers,
+        )
 
     try:
-        conn     = await asyncpg.connect(**DB_CONFIG)
-        rows     = await _get_user_inventory(conn, steamid)
-        price_mp = await _get_price_map(conn)
-        factors  = await _get_currency_factors(conn)
+        with metrics.GETJSONINV_SECONDS.time(stage="query"):
+            async with db.acquire(pool) as conn:
+                rows = await _get_user_inventory(conn, steamid)
 
-        out = [
-            _compose_item_json(r, price_mp.get((r["appid"], r["market_hash_name"]), 0.0), factors)
-            for r in rows
-        ]
+        with metrics.GETJSONINV_SECONDS.time(stage="compose"):
+            out = _compose_items(rows, factors)
 
-        file_path = os.path.join(JSON_DIR, f"{steamid}.json")
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(out, f, ensure_ascii=False, indent=2)
+        with metrics.GETJSONINV_SECONDS.time(stage="serialize"):
+            data = _dumps(out)
+        file_path = json_cache.write_bytes(steamid, key, data)
 
-        await conn.close()
         logging.info(f"✅ {file_path} создан ({len(out)} позиций)")
-        return JSONResponse(content=out)
+        return Response(content=data, media_type="application/json", headers=headers)
 
     except Exception as e:
         logging.critical(f"🔥 Ошибка JSON‑инвентаря: {e}")
         raise HTTPException(500, "Internal error")
+
+    finally:
+        _finish_build(steamid, key, build)
@@ -0,0 +1,115 @@
+# routers/portfolio.py
+"""
+Кривая стоимости инвентаря по истории из portfolio_history.
+
+Точки пишутся только при изменении суммы, поэтому между ними стоимость
+постоянна. Без appid кривая — сумма по всем играм: для каждой игры
+берётся последнее известное значение. Длинная история сворачивается в
+не более чем points интервалов: value — последнее значение интервала,
+low/high — его крайние значения.
+"""
+import json
+from datetime import datetime, timedelta
+
+import asyncpg
+from fastapi import APIRouter, Request, HTTPException, Depends, Query
+
+import db
+
+router = APIRouter()
+
+MAX_POINTS = 2000
+
+# значение на начало периода — последняя точка до start по каждой игре
+PORTFOLIO_SQL = """
+    SELECT * FROM (
+        SELECT DISTINCT ON (appid) appid, ts, total_usd, items, totals
+        FROM portfolio_history
+        WHERE steamid = $1 AND ($2::int IS NULL OR appid = $2) AND ts < $3
+        ORDER BY appid, ts DESC
+    ) prev
+    UNION ALL
+    SELECT appid, ts, total_usd, items, totals
+    FROM portfolio_history
+    WHERE steamid = $1 AND ($2::int IS NULL OR appid = $2)
+      AND ts >= $3 AND ts < $4
+    ORDER BY ts
+"""
+
+
+def _value(row, currency: str) -> float | None:
+    if currency == "USD":
+        return float(row["total_usd"])
+    value = json.loads(row["totals"]).get(currency)
+    return None if value is None else float(value)
+
+
+def _curve(rows, currency: str, start: datetime) -> list[tuple[datetime, float, int]]:
+    """Ступенчатая кривая (ts, стоимость, предметов) суммой по играм."""
+    values: dict[int, float] = {}
+    items: dict[int, int] = {}
+    curve = []
+    for r in rows:
+        value = _value(r, currency)
+        if value is None:
+            continue
+        values[r["appid"]] = value
+        items[r["appid"]] = r["items"]
+        point = (max(r["ts"], start), round(sum(values.values()), 2), sum(items.values()))
+        # несколько игр с одним временем — одна точка
+        if curve and curve[-1][0] == point[0]:
+            curve[-1] = point
+        else:
+            curve.append(point)
+    return curve
+
+
+def _downsample(curve, start: datetime, end: datetime, points: int) -> list[dict]:
+    if len(curve) <= points:
+        return [
+            {"ts": ts, "value": v, "low": v, "high": v, "items": n} for ts, v, n in curve
+        ]
+
+    width = (end - start) / points
+    out: list[dict] = []
+    for ts, v, n in curve:
+        bucket = start + width * int((ts - start) / width)
+        if out and out[-1]["ts"] == bucket:
+            last = out[-1]
+            last["value"], last["items"] = v, n
+            last["low"], last["high"] = min(last["low"], v), max(last["high"], v)
+        else:
+            out.append({"ts": bucket, "value": v, "low": v, "high": v, "items": n})
+    return out
+
+
+@router.get("/portfolio/{steamid}")
+async def portfolio_curve(
+    steamid: str,
+    request: Request,
+    appid: int | None = None,
+    currency: str = "USD",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    points: int = Query(200, ge=1, le=MAX_POINTS),
+    pool: asyncpg.Pool = Depends(db.get_pool),
+):
+    if "steamid" not in request.session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    end = db.utc_naive(end) or datetime.utcnow()
+    start = db.utc_naive(start) or end - timedelta(days=90)
+    if start >= end:
+        raise HTTPException(400, "start must be before end")
+    currency = currency.upper()
+
+    rows = await db.fetch_or_empty(pool, PORTFOLIO_SQL, steamid, appid, start, end)
+    curve = _curve(rows, currency, start)
+    return {
+        "steamid":  steamid,
+        "appid":    appid,
+        "currency": currency,
+        "start":    start,
+        "end":      end,
+        "points":   _downsample(curve, start, end, points),
+    }
@@ -0,0 +1,120 @@
+# routers/price_history.py
+"""
+Чтение истории цен, которую пишет item_steam_apis.
+
+Свежие недели — сырые изменения из price_history (партиции по неделям),
+старые — дневные OHLC из price_history_daily. Хранятся только изменения
+цены, поэтому интервалы без изменений в ответе отсутствуют: цена в них
+равна последней известной точке.
+"""
+from datetime import datetime, timedelta
+
+import asyncpg
+from fastapi import APIRouter, HTTPException, Depends, Query
+
+import db
+
+router = APIRouter()
+
+INTERVALS = ("day", "week", "month")
+
+# дневные свёртки отдаются закрытием дня, сырые точки — как есть;
+# $3/$4 — timestamp: день сравнивается как его полночь, время границ не теряется
+HISTORY_SQL = """
+    SELECT day::timestamp AS ts, close AS price
+    FROM price_history_daily
+    WHERE appid = $1 AND market_hash_name = $2
+      AND day >= $3::timestamp AND day < $4::timestamp
+    UNION ALL
+    SELECT ts, price
+    FROM price_history
+    WHERE appid = $1 AND market_hash_name = $2
+      AND ts >= $3 AND ts < $4
+    ORDER BY ts
+"""
+
+# open/close — первая и последняя цена в интервале; дневные свёртки и сырые
+# точки сводятся к одному виду (open, high, low, close, samples)
+OHLC_SQL = """
+    WITH pts AS (
+        SELECT day::timestamp AS ts, open, high, low, close, samples
+        FROM price_history_daily
+        WHERE appid = $1 AND market_hash_name = $2
+          AND day >= $3::timestamp AND day < $4::timestamp
+        UNION ALL
+        SELECT ts, price, price, price, price, 1
+        FROM price_history
+        WHERE appid = $1 AND market_hash_name = $2
+          AND ts >= $3 AND ts < $4
+    )
+    SELECT
+        date_trunc($5, ts) AS bucket,
+        (array_agg(open ORDER BY ts))[1] AS open,
+        MAX(high) AS high,
+        MIN(low) AS low,
+        (array_agg(close ORDER BY ts DESC))[1] AS close,
+        SUM(samples)::int AS samples
+    FROM pts
+    GROUP BY bucket
+    ORDER BY bucket
+"""
+
+
+def _range(start: datetime | None, end: datetime | None) -> tuple[datetime, datetime]:
+    end = db.utc_naive(end) or datetime.utcnow()
+    start = db.utc_naive(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(400, "start must be before end")
+    return start, end
+
+
+@router.get("/prices/history")
+async def price_history(
+    appid: int,
+    name: str = Query(..., description="market_hash_name"),
+    start: datetime | None = None,
+    end: datetime | None = None,
+    pool: asyncpg.Pool = Depends(db.get_pool),
+):
+    start, end = _range(start, end)
+    rows = await db.fetch_or_empty(pool, HISTORY_SQL, appid, name, start, end)
+    return {
+        "appid": appid,
+        "market_hash_name": name,
+        "start": start,
+        "end": end,
+        "points": [{"ts": r["ts"], "price": float(r["price"])} for r in rows],
+    }
+
+
+@router.get("/prices/ohlc")
+async def price_ohlc(
+    appid: int,
+    name: str = Query(..., description="market_hash_name"),
+    interval: str = "day",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    pool: asyncpg.Pool = Depends(db.get_pool),
+):
+    if interval not in INTERVALS:
+        raise HTTPException(400, f"interval must be one of: {', '.join(INTERVALS)}")
+    start, end = _range(start, end)
+    rows = await db.fetch_or_empty(pool, OHLC_SQL, appid, name, start, end, interval)
+    return {
+        "appid": appid,
+        "market_hash_name": name,
+        "interval": interval,
+        "start": start,
+        "end": end,
+        "candles": [
+            {
+                "ts":      r["bucket"],
+                "open":    float(r["open"]),
+                "high":    float(r["high"]),
+                "low":     float(r["low"]),
+                "close":   float(r["close"]),
+                "samples": r["samples"],
+            }
+            for r in rows
+        ],
+    }
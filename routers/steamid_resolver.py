@@ -1,18 +1,24 @@
 import os
+import time
+import asyncio
 import logging
 import re
-import configparser
+from collections import OrderedDict
 from urllib.parse import urlsplit
 
-from fastapi import APIRouter, Query, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Request, Query, HTTPException
 import httpx
 
+import db
+import http_client
+import metrics
+import jobs
+import inventory
+from settings import config
+
 # ────────────────────────────
 #  Конфигурация и логирование
 # ────────────────────────────
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "../config.ini")
-config = configparser.ConfigParser()
-config.read(CONFIG_PATH)
 
 STEAM_API_KEY = config["steam"].get("steam_api_key", "").strip()
 
@@ -25,8 +31,7 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
 )
 
-INVENTORY_API = "http://localhost:8000/inventory"            # внутренний вызов
-SUPPORTED_APPS = {"730", "570", "440", "252490"}             # CS2, Dota 2, TF2, Rust
+SUPPORTED_APPS = {str(appid) for appid in inventory.SUPPORTED_APPS}
 
 # ────────────────────────────
 #  Регулярки
@@ -35,6 +40,19 @@ VANITY_RE  = re.compile(r"(?:https?://)?(?:www\.)?steamcommunity\.com/id/([^/#?]
 STEAMID_RE = re.compile(r"(?:https?://)?(?:www\.)?steamcommunity\.com/profiles/(\d+)", re.I)
 JUST_ID_RE = re.compile(r"^\d{17}$")
 
+# ────────────────────────────
+#  Кэш vanity → steamid64
+# ────────────────────────────
+VANITY_TTL      = config.getint("vanity", "ttl_seconds", fallback=86400)
+VANITY_NEG_TTL  = config.getint("vanity", "negative_ttl_seconds", fallback=600)
+VANITY_LRU_SIZE = config.getint("vanity", "lru_size", fallback=10000)
+VANITY_DB_CACHE = config.getboolean("vanity", "db_cache", fallback=False)
+
+_MISS = object()
+_vanity_lru: OrderedDict[str, tuple[str | None, float]] = OrderedDict()   # name → (steamid|None, expires)
+_vanity_inflight: dict[str, asyncio.Task] = {}
+_vanity_table_ready = False
+
 # ────────────────────────────
 #  Роутер
 # ────────────────────────────
@@ -42,23 +60,36 @@ router = APIRouter()
 
 @router.get("/{appid}/steamid")
 async def resolve_and_trigger_inventory_load(
-    background_tasks: BackgroundTasks,
     appid: str,
+    request: Request,
     text: str = Query(...)
 ):
     """
     Принимает любой ввод (URL / ник / SteamID64), извлекает steamid64,
-    запускает фоновый /inventory/{steamid}/{appid} и возвращает
-    {"steamid64": "<id>"} — это ждёт фронт‑энд.
+    ставит загрузку инвентаря в очередь и возвращает
+    {"steamid64": "<id>", "job_id": "<id>"} — steamid64 ждёт фронт‑энд,
+    состояние загрузки доступно по /jobs/{job_id}. Очередь заполнена —
+    загрузка не ставится (число обращений к steamapis ограничено
+    воркерами jobs), job_id = null. Только для вошедших пользователей:
+    загрузка — платный вызов steamapis.
     """
+    if "steamid" not in request.session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
     if appid not in SUPPORTED_APPS:
         raise HTTPException(400, "Unsupported appid")
 
     steamid = await _extract_steamid(text)
     logging.info(f"Resolved '{text}' → {steamid} (appid={appid})")
 
-    background_tasks.add_task(_trigger_inventory_load, steamid, appid)
-    return {"steamid64": steamid}
+    try:
+        job = jobs.submit(steamid, int(appid))
+    except jobs.QueueFull:
+        # steamid64 фронт-энд получает всегда; загрузку под перегрузкой не берём
+        logging.warning(f"⚠️ Очередь загрузок заполнена, {steamid}/{appid} не поставлен")
+        return {"steamid64": steamid, "job_id": None}
+
+    return {"steamid64": steamid, "job_id": job.id}
 
 # ────────────────────────────
 #  Вспомогательные функции
@@ -98,15 +129,57 @@ async def _extract_steamid(text: str) -> str:
     return await _resolve_vanity(text)
 
 async def _resolve_vanity(username: str) -> str:
+    """
+    vanity → steamid64 через кэш: LRU в памяти (отрицательные ответы тоже,
+    с коротким TTL), затем таблица vanity_cache, затем ResolveVanityURL.
+    Одновременные запросы одного ника ждут один вызов Steam API.
+    """
     if not STEAM_API_KEY:
         raise HTTPException(500, "Steam API key not configured")
 
+    name = username.strip().lower()
+    started = time.perf_counter()
+    steamid = _lru_get(name)
+    metrics.cache_hit("vanity_lru", steamid is not _MISS)
+
+    if steamid is _MISS:
+        task = _vanity_inflight.get(name)
+        if task is None:
+            task = asyncio.create_task(_resolve_vanity_uncached(name))
+            _vanity_inflight[name] = task
+            task.add_done_callback(lambda _t: _vanity_inflight.pop(name, None))
+        steamid = await asyncio.shield(task)
+    else:
+        metrics.VANITY_SECONDS.observe(time.perf_counter() - started, source="lru")
+
+    if steamid is None:
+        raise HTTPException(404, "Profile not found")
+    return steamid
+
+async def _resolve_vanity_uncached(name: str) -> str | None:
+    started = time.perf_counter()
+    if VANITY_DB_CACHE:
+        steamid = await _db_get(name)
+        metrics.cache_hit("vanity_db", steamid is not _MISS)
+        if steamid is not _MISS:
+            _lru_put(name, steamid)
+            metrics.VANITY_SECONDS.observe(time.perf_counter() - started, source="db")
+            return steamid
+
+    steamid = await _fetch_vanity(name)       # 503 не кэшируется — пробрасывается
+    metrics.VANITY_SECONDS.observe(time.perf_counter() - started, source="api")
+    _lru_put(name, steamid)
+    if VANITY_DB_CACHE:
+        await _db_put(name, steamid)
+    return steamid
+
+async def _fetch_vanity(username: str) -> str | None:
+    """ResolveVanityURL; None — профиль не найден, HTTPException 503 — сбой Steam."""
     url = "https://api.steampowered.com/ISteamUser/ResolveVanityURL/v1/"
     params = {"key": STEAM_API_KEY, "vanityurl": username}
 
     try:
-        async with httpx.AsyncClient(timeout=8) as client:
-            resp = await client.get(url, params=params)
+        resp = await http_client.get(url, params=params, timeout=8)
     except httpx.RequestError as exc:
         logging.error(f"ResolveVanityURL network error: {exc}")
         raise HTTPException(503, "Steam API unreachable")
@@ -119,15 +192,68 @@ async def _resolve_vanity(username: str) -> str:
     data = resp.json().get("response", {})
     if data.get("success") == 1:
         return data["steamid"]
+    return None
 
-    raise HTTPException(404, "Profile not found")
+# ────────────────────────────
+#  Уровни кэша
+# ────────────────────────────
+def _lru_get(name: str):
+    entry = _vanity_lru.get(name)
+    if entry is None:
+        return _MISS
+    steamid, expires = entry
+    if expires < time.monotonic():
+        del _vanity_lru[name]
+        return _MISS
+    _vanity_lru.move_to_end(name)
+    return steamid
+
+def _lru_put(name: str, steamid: str | None) -> None:
+    ttl = VANITY_TTL if steamid is not None else VANITY_NEG_TTL
+    _vanity_lru[name] = (steamid, time.monotonic() + ttl)
+    _vanity_lru.move_to_end(name)
+    while len(_vanity_lru) > VANITY_LRU_SIZE:
+        _vanity_lru.popitem(last=False)
 
-async def _trigger_inventory_load(steamid: str, appid: str) -> None:
-    url = f"{INVENTORY_API}/{steamid}/{appid}"
-    logging.info(f"Trigger inventory load → {url}")
+async def _ensure_vanity_table(conn) -> None:
+    global _vanity_table_ready
+    if _vanity_table_ready:
+        return
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS vanity_cache (
+            vanity      TEXT PRIMARY KEY,
+            steamid     TEXT,
+            expires_at  TIMESTAMPTZ NOT NULL
+        )
+    """)
+    _vanity_table_ready = True
+
+async def _db_get(name: str):
+    try:
+        async with db.acquire() as conn:
+            await _ensure_vanity_table(conn)
+            row = await conn.fetchrow(
+                "SELECT steamid FROM vanity_cache WHERE vanity = $1 AND expires_at > now()",
+                name,
+            )
+    except Exception as e:
+        logging.warning(f"vanity_cache read failed: {e}")
+        return _MISS
+    return _MISS if row is None else row["steamid"]
 
+async def _db_put(name: str, steamid: str | None) -> None:
+    ttl = VANITY_TTL if steamid is not None else VANITY_NEG_TTL
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            await client.get(url)
-    except Exception as exc:
-        logging.error(f"Inventory API call failed: {exc}")
+        async with db.acquire() as conn:
+            await _ensure_vanity_table(conn)
+            await conn.execute(
+                """
+                INSERT INTO vanity_cache (vanity, steamid, expires_at)
+                VALUES ($1, $2, now() + make_interval(secs => $3))
+                ON CONFLICT (vanity) DO UPDATE
+                    SET steamid = EXCLUDED.steamid, expires_at = EXCLUDED.expires_at
+                """,
+                name, steamid, float(ttl),
+            )
+    except Exception as e:
+        logging.warning(f"vanity_cache write failed: {e}")
@@ -0,0 +1,159 @@
+# scheduler.py
+"""
+Встроенный планировщик синхронизаций вместо внешнего cron.
+
+Каждая синхронизация крутится в своём цикле внутри lifespan: интервал
+из [scheduler] плюс случайный джиттер, чтобы воркеры и соседние задачи
+не стартовали в одну секунду. Перед запуском берётся аренда
+(db.try_lease) на имя задачи — при нескольких воркерах uvicorn работает
+ровно один, остальные отмечают запуск как skipped. Соединение пула на
+время синхронизации не удерживается.
+Блокирующая синхронизация цен (psycopg2 + requests) уходит в поток и
+не держит event loop.
+"""
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable
+
+from fastapi import APIRouter, HTTPException, Depends
+
+import db
+import metrics
+import curse_sync
+import item_steam_apis
+from auth import require_admin
+from settings import config
+
+router = APIRouter()
+
+# === НАСТРОЙКИ ===
+ENABLED = config.getboolean("scheduler", "enabled", fallback=True)
+JITTER = config.getfloat("scheduler", "jitter_seconds", fallback=30)
+RUN_ON_START = config.getboolean("scheduler", "run_on_start", fallback=False)
+LEASE_SECONDS = config.getfloat("scheduler", "lease_seconds", fallback=3600)
+
+OK, FAILED, SKIPPED = "ok", "failed", "skipped"
+
+
+@dataclass
+class SyncState:
+    name: str
+    interval: float                    # сек. между запусками
+    running: bool = False
+    runs: int = 0
+    last_started: float | None = None
+    last_finished: float | None = None
+    last_duration: float | None = None
+    last_outcome: str | None = None
+    last_error: str | None = None
+
+
+async def _steamapis_sync() -> bool:
+    return await asyncio.to_thread(item_steam_apis.incremental_refresh_data)
+
+
+_SYNCS: dict[str, tuple[SyncState, Callable[[], Awaitable[bool]]]] = {
+    "steamapis": (
+        SyncState("steamapis", 60 * config.getfloat("scheduler", "steamapis_interval_minutes", fallback=10)),
+        _steamapis_sync,
+    ),
+    "curse": (
+        SyncState("curse", 60 * config.getfloat("scheduler", "curse_interval_minutes", fallback=60)),
+        curse_sync.sync,
+    ),
+}
+
+_loops: list[asyncio.Task] = []
+_manual: set[asyncio.Task] = set()
+
+
+# === Жизненный цикл ===
+async def start() -> None:
+    if not ENABLED:
+        logging.info("⏰ Планировщик синхронизаций выключен")
+        return
+    _loops[:] = [asyncio.create_task(_loop(name)) for name in _SYNCS]
+    logging.info(
+        "⏰ Планировщик: " + ", ".join(f"{n} каждые {s.interval:.0f} с" for n, (s, _) in _SYNCS.items())
+    )
+
+
+async def stop() -> None:
+    tasks = _loops + list(_manual)
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _loops.clear()
+
+
+async def _loop(name: str) -> None:
+    state, _ = _SYNCS[name]
+    delay = random.uniform(0, JITTER) if RUN_ON_START else state.interval + random.uniform(0, JITTER)
+    while True:
+        await asyncio.sleep(delay)
+        await run(name)
+        delay = state.interval + random.uniform(0, JITTER)
+
+
+# === Запуск ===
+async def run(name: str) -> SyncState:
+    """Один запуск под арендой; занятая аренда — skipped, а не ожидание."""
+    state, func = _SYNCS[name]
+    if state.running:
+        return state
+
+    state.running = True
+    state.last_started = time.time()
+    started = time.perf_counter()
+    lease = f"sync:{name}"
+    try:
+        token = await db.try_lease(lease, LEASE_SECONDS)
+        if token is None:
+            logging.info(f"⏭ Синхронизация {name}: выполняется другим воркером")
+            state.last_outcome, state.last_error = SKIPPED, None
+            return state
+        try:
+            ok = await func()
+            state.last_outcome = OK if ok else FAILED
+            state.last_error = None if ok else "sync reported failure"
+        finally:
+            await db.release_lease(lease, token)
+    except Exception as e:
+        logging.error(f"❌ Синхронизация {name} упала: {e}")
+        state.last_outcome, state.last_error = FAILED, str(e)
+    finally:
+        state.running = False
+        state.runs += 1
+        state.last_finished = time.time()
+        state.last_duration = round(time.perf_counter() - started, 3)
+        metrics.SYNC_SECONDS.observe(state.last_duration, sync=name, outcome=state.last_outcome)
+
+    logging.info(f"⏰ Синхронизация {name}: {state.last_outcome} за {state.last_duration} с")
+    return state
+
+
+def stats() -> dict:
+    return {"enabled": ENABLED, "syncs": {name: asdict(s) for name, (s, _) in _SYNCS.items()}}
+
+
+# === Эндпоинты ===
+@router.get("/sync", dependencies=[Depends(require_admin)])
+async def sync_status():
+    return stats()
+
+
+@router.post("/sync/{name}", status_code=202, dependencies=[Depends(require_admin)])
+async def sync_trigger(name: str):
+    if name not in _SYNCS:
+        raise HTTPException(404, "Unknown sync")
+    state, _ = _SYNCS[name]
+    if state.running:
+        raise HTTPException(409, "Sync is already running")
+
+    task = asyncio.create_task(run(name))
+    _manual.add(task)
+    task.add_done_callback(_manual.discard)
+    return {"started": name}
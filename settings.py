@@ -0,0 +1,20 @@
+# settings.py
+"""Единая точка чтения config.ini для приложения и роутеров."""
+import os
+import configparser
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+config = configparser.ConfigParser()
+config.read(os.path.join(ROOT_DIR, "config.ini"))
+
+DB_CONFIG = {
+    "user":     config["database"]["user"],
+    "password": config["database"]["password"],
+    "database": config["database"]["dbname"],
+    "host":     config["database"]["host"],
+    "port":     config.getint("database", "port"),
+}
+
+DB_POOL_MIN_SIZE = config.getint("database", "pool_min_size", fallback=2)
+DB_POOL_MAX_SIZE = config.getint("database", "pool_max_size", fallback=10)
@@ -0,0 +1,21 @@
+# tests/conftest.py
+"""
+Модули приложения читают config.ini при импорте (settings.py), поэтому
+тесты запускаются в рабочем окружении: с config.ini в корне и пакетами
+из requirements.txt. Чего нет — модуль теста пропускается.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def require_app(*modules: str) -> None:
+    """Пропуск модуля теста без config.ini или нужных пакетов."""
+    if not os.path.exists(os.path.join(ROOT_DIR, "config.ini")):
+        pytest.skip("нужен config.ini", allow_module_level=True)
+    for name in modules:
+        pytest.importorskip(name)
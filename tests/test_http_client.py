@@ -0,0 +1,112 @@
+# tests/test_http_client.py
+"""Повторы и token bucket http_client на локальном заглушка-сервере."""
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import require_app
+
+require_app("httpx")
+
+import http_client  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    """Сервер отвечает статусами из statuses по очереди, затем 200; hits — время запросов."""
+    statuses: list[int] = []
+    hits: list[float] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(time.monotonic())
+            status = statuses.pop(0) if statuses else 200
+            body = b"{}"
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    try:
+        yield f"http://{host}:{port}/inventory", statuses, hits
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_client(monkeypatch):
+    monkeypatch.setattr(http_client, "RETRIES", 3)
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(http_client, "_buckets", {})
+    monkeypatch.setattr(http_client, "RATE_LIMITS", {})
+
+
+def _run(scenario):
+    async def main():
+        await http_client.start()
+        try:
+            return await scenario()
+        finally:
+            await http_client.stop()
+
+    return asyncio.run(main())
+
+
+def test_retries_5xx_and_429(stub):
+    url, statuses, hits = stub
+    statuses += [503, 429, 502]
+
+    resp = _run(lambda: http_client.get(url))
+
+    assert resp.status_code == 200
+    assert len(hits) == 4
+
+
+def test_returns_last_response_after_retries(stub):
+    url, statuses, hits = stub
+    statuses += [503] * 10
+
+    resp = _run(lambda: http_client.get(url))
+
+    assert resp.status_code == 503
+    assert len(hits) == http_client.RETRIES + 1
+
+
+def test_no_retry_on_4xx(stub):
+    url, statuses, hits = stub
+    statuses.append(404)
+
+    resp = _run(lambda: http_client.get(url))
+
+    assert resp.status_code == 404
+    assert len(hits) == 1
+
+
+def test_token_bucket_spaces_requests(stub, monkeypatch):
+    url, _, hits = stub
+    rate, n = 20.0, 6
+    monkeypatch.setitem(http_client.RATE_LIMITS, "127.0.0.1", (rate, 1))
+
+    async def burst():
+        return await asyncio.gather(*(http_client.get(url) for _ in range(n)))
+
+    responses = _run(burst)
+
+    assert all(r.status_code == 200 for r in responses)
+    # burst 1: после первого запроса — не чаще rate в секунду
+    assert hits[-1] - hits[0] >= (n - 1) / rate * 0.9
@@ -0,0 +1,54 @@
+# tests/test_item_steam_apis.py
+import io
+import csv
+
+import pytest
+
+from conftest import require_app
+
+require_app("psycopg2", "requests")
+
+import item_steam_apis  # noqa: E402
+
+
+class CopyCursor:
+    """Читает поток так же, как psycopg2 copy_expert: read(size) до пустой строки."""
+
+    MAX_READS = 10_000
+
+    def __init__(self):
+        self.data = ""
+
+    def copy_expert(self, sql, file, size):
+        for _ in range(self.MAX_READS):
+            chunk = file.read(size)
+            if not chunk:
+                return
+            self.data += chunk
+        raise AssertionError("COPY-поток не заканчивается")
+
+
+def _norms(n):
+    return [
+        {col: f"{col}-{i}" for col in item_steam_apis.ITEM_COLUMNS}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("wrap", [list, iter], ids=["list", "generator"])
+def test_copy_items_ends(wrap):
+    # инкрементальный режим передаёт список changed, полный — генератор
+    norms = _norms(5000)
+    cur = CopyCursor()
+
+    count = item_steam_apis._copy_items(cur, "steamapis_items_delta", wrap(norms))
+
+    rows = list(csv.reader(io.StringIO(cur.data)))
+    assert count == len(rows) == len(norms)
+    assert rows[-1][0] == norms[-1][item_steam_apis.ITEM_COLUMNS[0]]
+
+
+def test_copy_items_empty_list():
+    cur = CopyCursor()
+    assert item_steam_apis._copy_items(cur, "steamapis_items_delta", []) == 0
+    assert cur.data == ""